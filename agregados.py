@@ -0,0 +1,205 @@
+import os
+import numpy as np
+import pandas as pd
+from cache_lru import CacheLRU, assinatura_de
+from data_loader import concatenar_dados
+from filters import IndiceFiltros, filtros_da_sessao
+from instrumentacao import instrumentar
+
+# 🧊 Dimensões do cubo: ano-mês × UF × fonte × origem × classe de geração
+DIMENSOES_CUBO = ["ChaveAnoMes", "SigUFPrincipal", "NomFonteCombustivel", "DscOrigemCombustivel", "TipoGeracaoDistribuida"]
+COLUNA_VALOR = "MdaPotenciaFiscalizadaKw"
+MEDIDAS_CUBO = ["soma", "contagem", "usinas"]
+
+cache_cubos = CacheLRU(int(os.environ.get("CACHE_CUBOS_MB", "128")) * 1024 * 1024)
+
+
+class CuboAgregado:
+    """Soma, contagem e média da potência pré-agregadas por dimensão, construídas uma vez por dataset.
+
+    Cada célula guarda `soma` e `contagem` (usinas com potência informada), de onde sai a média,
+    e `usinas` (todas as linhas). A fatia segue a mesma semântica de `aplicar_filtros`.
+    """
+
+    def __init__(self, df):
+        self._definir_celulas(self.agrupar(df))
+
+    @staticmethod
+    def agrupar(df):
+        """Células do cubo de um DataFrame com as colunas derivadas."""
+        celulas = (
+            df.groupby(DIMENSOES_CUBO, observed=True)
+            .agg(soma=(COLUNA_VALOR, "sum"), contagem=(COLUNA_VALOR, "count"), usinas=(COLUNA_VALOR, "size"))
+            .reset_index()
+        )
+        # Linhas sem data (chave ausente) nunca passam no filtro de período
+        return celulas[celulas["ChaveAnoMes"] >= 0].reset_index(drop=True)
+
+    def _definir_celulas(self, celulas):
+        self.celulas = celulas
+        self._indice = IndiceFiltros(self.celulas)
+
+    def atualizado(self, removidas, incluidas):
+        """Novo cubo com as linhas `removidas` descontadas e as `incluidas` somadas.
+
+        Só as linhas alteradas são agrupadas; a combinação com as células atuais custa o número de
+        células, não o de usinas. Células que ficam sem nenhuma usina são descartadas.
+        """
+        saida = self.agrupar(removidas)
+        saida[MEDIDAS_CUBO] = -saida[MEDIDAS_CUBO]
+        celulas = (
+            concatenar_dados([self.celulas, self.agrupar(incluidas), saida])
+            .groupby(DIMENSOES_CUBO, observed=True)[MEDIDAS_CUBO].sum()
+            .reset_index()
+        )
+        celulas = celulas[celulas["usinas"] > 0].reset_index(drop=True)
+        # Resíduo de ponto flutuante das subtrações em células sem potência informada
+        celulas.loc[celulas["contagem"] == 0, "soma"] = 0.0
+
+        cubo = CuboAgregado.__new__(CuboAgregado)
+        cubo._definir_celulas(celulas)
+        return cubo
+
+    @property
+    def nbytes(self):
+        return int(self.celulas.memory_usage(deep=True).sum()) + self._indice.nbytes
+
+    def fatiar(self, inicio_data_num, fim_data_num, origens, fontes, estados):
+        """Células que atendem ao filtro da sidebar."""
+        return self.celulas[self._indice.mascara(inicio_data_num, fim_data_num, origens, fontes, estados)]
+
+
+def obter_cubo(df):
+    """Retorna o cubo agregado do dataset, construindo-o apenas na primeira vez."""
+    assinatura = assinatura_de(df)
+    if assinatura is None:
+        return CuboAgregado(df)
+    cubo = cache_cubos.obter(assinatura)
+    if cubo is None:
+        cubo = cache_cubos.guardar(assinatura, CuboAgregado(df))
+    return cubo
+
+
+@instrumentar()
+def fatiar_cubo(df, filtros=None):
+    """Fatia do cubo do dataset correspondente aos filtros (por padrão, os atuais da sidebar)."""
+    return obter_cubo(df).fatiar(*(filtros or filtros_da_sessao()))
+
+
+def ano_das_celulas(celulas):
+    """Ano de cada célula a partir da chave ano * 12 + mês (mês de 1 a 12)."""
+    return (celulas["ChaveAnoMes"] - 1) // 12
+
+
+def indicadores(celulas):
+    """Total de usinas e potência média (kW) de uma fatia do cubo."""
+    contagem = celulas["contagem"].sum()
+    media = celulas["soma"].sum() / contagem if contagem else np.nan
+    return int(celulas["usinas"].sum()), media
+
+
+def soma_por(celulas, coluna):
+    """Potência total agrupada por uma dimensão (ou por "Ano") a partir das células do cubo."""
+    chave = ano_das_celulas(celulas).rename("Ano") if coluna == "Ano" else celulas[coluna]
+    return celulas.groupby(chave, observed=True)["soma"].sum().rename(COLUNA_VALOR)
+
+
+# 📈 Série temporal agregada por período
+GRANULARIDADES = {"Mês": 1, "Trimestre": 3, "Ano": 12}
+
+
+def serie_temporal(dados, granularidade="Mês", coluna_valor="soma"):
+    """Soma da potência por período (Mês, Trimestre ou Ano) e UF, a partir das células do cubo ou das linhas."""
+    meses_por_periodo = GRANULARIDADES[granularidade]
+    dados = dados[dados["ChaveAnoMes"] >= 0]
+    chave = dados["ChaveAnoMes"].to_numpy() - 1
+    ano, mes = chave // 12, chave % 12 + 1
+    inicio_periodo = (mes - 1) // meses_por_periodo * meses_por_periodo + 1
+    data = pd.to_datetime(pd.DataFrame({"year": ano, "month": inicio_periodo, "day": 1}))
+
+    serie = (
+        dados[coluna_valor].groupby([data.to_numpy(), dados["SigUFPrincipal"].to_numpy()]).sum()
+        .rename_axis(["DatInicioVigencia", "SigUFPrincipal"])
+        .rename(COLUNA_VALOR)
+        .reset_index()
+    )
+    return serie.sort_values(["SigUFPrincipal", "DatInicioVigencia"], ignore_index=True)
+
+
+def reduzir_lttb(x, y, n_pontos):
+    """Índices dos pontos escolhidos pelo Largest-Triangle-Three-Buckets, que preserva a forma da série."""
+    n = len(x)
+    if n <= n_pontos:
+        return np.arange(n)
+    if n_pontos < 3:
+        return np.array([0, n - 1])[:max(n_pontos, 1)]
+
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    limites = np.linspace(1, n - 1, n_pontos - 1).astype(int)
+    indices = np.empty(n_pontos, dtype=int)
+    indices[0], indices[-1] = 0, n - 1
+
+    anterior = 0
+    for i in range(n_pontos - 2):
+        inicio, fim = limites[i], limites[i + 1]
+        fim_proximo = limites[i + 2] if i + 2 < len(limites) else n
+        media_x, media_y = x[fim:fim_proximo].mean(), y[fim:fim_proximo].mean()
+        # Área do triângulo (ponto escolhido anterior, candidato, média do próximo bucket)
+        area = np.abs((x[anterior] - media_x) * (y[inicio:fim] - y[anterior])
+                      - (x[anterior] - x[inicio:fim]) * (media_y - y[anterior]))
+        anterior = inicio + int(np.argmax(area))
+        indices[i + 1] = anterior
+    return indices
+
+
+def reduzir_series(serie, orcamento_pontos, coluna_grupo="SigUFPrincipal", coluna_x="DatInicioVigencia",
+                   coluna_y=COLUNA_VALOR):
+    """Reduz cada série (uma por grupo) com LTTB para que o total de pontos caiba no orçamento.
+
+    O orçamento só é excedido com mais grupos que pontos: cada grupo mantém ao menos um ponto.
+    """
+    grupos = serie.groupby(coluna_grupo, observed=True, sort=False)
+    if len(serie) <= orcamento_pontos or grupos.ngroups == 0:
+        return serie
+    pontos_por_grupo = max(1, orcamento_pontos // grupos.ngroups)
+
+    partes = []
+    for _, grupo in grupos:
+        grupo = grupo.dropna(subset=[coluna_y]).sort_values(coluna_x)
+        x = grupo[coluna_x].to_numpy()
+        x = x.astype("datetime64[ns]").astype("int64") if np.issubdtype(x.dtype, np.datetime64) else x
+        partes.append(grupo.iloc[reduzir_lttb(x, grupo[coluna_y].to_numpy(), pontos_por_grupo)])
+    return pd.concat(partes, ignore_index=True)
+
+
+# 🔥 Grade ponderada pela potência para o mapa de calor
+def tamanho_celula_para_zoom(zoom, raio_px=15):
+    """Lado da célula (graus) equivalente a meio raio do HeatMap no nível de zoom informado."""
+    graus_por_pixel = 360 / (256 * 2 ** zoom)
+    return graus_por_pixel * raio_px / 2
+
+
+def agregar_grade(df, tamanho_celula_graus, coluna_valor=COLUNA_VALOR):
+    """Agrupa as usinas em uma grade regular e devolve só as células ocupadas, com a potência somada.
+
+    Cada célula é posicionada no centróide ponderado pela potência das suas usinas.
+    """
+    lat = df["NumCoordNEmpreendimento"].to_numpy(dtype="float64")
+    lon = df["NumCoordEEmpreendimento"].to_numpy(dtype="float64")
+    peso = np.nan_to_num(df[coluna_valor].to_numpy(dtype="float64"), nan=0.0)
+
+    # Linha e coluna da grade combinadas em uma única chave inteira (unique 1-D é bem mais rápido)
+    linhas = np.floor(lat / tamanho_celula_graus).astype(np.int64)
+    colunas = np.floor(lon / tamanho_celula_graus).astype(np.int64)
+    celulas, inverso = np.unique((linhas << 32) + colunas, return_inverse=True)
+
+    soma = np.bincount(inverso, weights=peso, minlength=len(celulas))
+    usinas = np.bincount(inverso, minlength=len(celulas))
+    # Centróide ponderado; células sem potência informada ficam no centróide simples
+    base = np.where(soma > 0, soma, usinas)
+    pesos_centro = np.where(soma[inverso] > 0, peso, 1.0)
+    centro_lat = np.bincount(inverso, weights=lat * pesos_centro, minlength=len(celulas)) / base
+    centro_lon = np.bincount(inverso, weights=lon * pesos_centro, minlength=len(celulas)) / base
+
+    return pd.DataFrame({"lat": centro_lat, "lon": centro_lon, "peso": soma, "usinas": usinas})
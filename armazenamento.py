@@ -0,0 +1,178 @@
+import os
+import json
+import shutil
+import threading
+import datetime
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# 📦 Repositório colunar: um diretório Parquet por conteúdo (hash SHA-1 do CSV de origem)
+DATASETS_DIR = "datasets"
+MANIFESTO_PATH = os.path.join(DATASETS_DIR, "manifesto.json")
+MARCADOR_CONCLUIDO = "_CONCLUIDO"
+
+# Incrementar sempre que o esquema gravado mudar: datasets antigos são reingeridos
+VERSAO_ESQUEMA = 4
+
+# Partições: um diretório por UF; dentro de cada arquivo as linhas ficam ordenadas por ano,
+# e as estatísticas min/max dos row groups permitem pular os anos fora do filtro.
+# Diretórios por ano gerariam centenas de arquivos minúsculos, cujo custo de abertura domina a leitura.
+COLUNA_ANO_PARTICAO = "AnoInicioVigencia"
+LINHAS_POR_ROW_GROUP = 64_000
+PARTICIONAMENTO = ds.partitioning(pa.schema([("SigUFPrincipal", pa.string())]), flavor="hive")
+VALOR_NULO_PARTICAO = "__HIVE_DEFAULT_PARTITION__"
+
+# Gravação de conteúdos e registro no manifesto: quem grava um conteúdo o registra dentro da mesma
+# seção crítica, para que a limpeza de conteúdos sem referência não apague um diretório recém-gravado
+# (ou a base cujas partições estão sendo ligadas) antes do registro
+lock_repositorio = threading.RLock()
+
+
+def caminho_dataset(conteudo_hash):
+    """Diretório Parquet particionado de um conteúdo."""
+    return os.path.join(DATASETS_DIR, conteudo_hash)
+
+
+def ler_manifesto():
+    """Lê o manifesto que associa nomes de datasets aos conteúdos armazenados."""
+    if not os.path.exists(MANIFESTO_PATH):
+        return {"datasets": {}}
+    with open(MANIFESTO_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _salvar_manifesto(manifesto):
+    os.makedirs(DATASETS_DIR, exist_ok=True)
+    temporario = MANIFESTO_PATH + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(manifesto, f, ensure_ascii=False, indent=2)
+    os.replace(temporario, MANIFESTO_PATH)
+
+
+def dataset_existe(conteudo_hash):
+    """Indica se o conteúdo já foi convertido por completo para Parquet, na versão atual do esquema."""
+    marcador = os.path.join(caminho_dataset(conteudo_hash), MARCADOR_CONCLUIDO)
+    if not os.path.exists(marcador):
+        return False
+    with open(marcador, "r", encoding="utf-8") as f:
+        return f.read().strip() == str(VERSAO_ESQUEMA)
+
+
+def nome_particao(uf):
+    """Diretório (hive) da partição de uma UF; UF ausente vai para a partição padrão de nulos."""
+    return f"SigUFPrincipal={VALOR_NULO_PARTICAO if uf is None else uf}"
+
+
+def ufs_do_dataset(conteudo_hash):
+    """UFs com partição gravada no dataset (None para a partição de UF ausente)."""
+    ufs = []
+    for entrada in os.listdir(caminho_dataset(conteudo_hash)):
+        if entrada.startswith("SigUFPrincipal="):
+            uf = entrada.split("=", 1)[1]
+            ufs.append(None if uf == VALOR_NULO_PARTICAO else uf)
+    return ufs
+
+
+def ligar_ou_copiar(origem, destino):
+    """Hard link do arquivo (sem regravar os dados); cópia se o sistema de arquivos não suportar."""
+    try:
+        os.link(origem, destino)
+    except OSError:
+        shutil.copy2(origem, destino)
+
+
+def escrever_dataset(df, conteudo_hash, base=None, ufs_reaproveitadas=()):
+    """Grava o DataFrame em Parquet particionado por UF e ano de início de vigência.
+
+    Com `base`, as partições das `ufs_reaproveitadas` são ligadas às do conteúdo `base` em vez de
+    regravadas; `df` deve conter apenas as linhas das demais UFs.
+    """
+    destino = caminho_dataset(conteudo_hash)
+    temporario = destino + ".tmp"
+    shutil.rmtree(temporario, ignore_errors=True)
+
+    df = df.assign(**{COLUNA_ANO_PARTICAO: df["DatInicioVigencia"].dt.year.astype("Int32")})
+    tabela = pa.Table.from_pandas(df, preserve_index=False)
+    ufs = tabela.column("SigUFPrincipal").cast(pa.string())
+    ordem = pc.sort_indices(pa.table({"uf": ufs, "ano": tabela.column(COLUNA_ANO_PARTICAO)}),
+                            sort_keys=[("uf", "ascending"), ("ano", "ascending")])
+    tabela = tabela.take(ordem)
+    ufs = ufs.take(ordem)
+    dados = tabela.drop_columns(["SigUFPrincipal"])
+
+    os.makedirs(temporario)
+    for uf in pc.unique(ufs).to_pylist():
+        mascara_uf = pc.is_null(ufs) if uf is None else pc.fill_null(pc.equal(ufs, uf), False)
+        diretorio_uf = os.path.join(temporario, nome_particao(uf))
+        os.makedirs(diretorio_uf)
+        pq.write_table(dados.filter(mascara_uf), os.path.join(diretorio_uf, "parte-0.parquet"),
+                       row_group_size=LINHAS_POR_ROW_GROUP)
+    for uf in ufs_reaproveitadas:
+        origem_uf = os.path.join(caminho_dataset(base), nome_particao(uf))
+        diretorio_uf = os.path.join(temporario, nome_particao(uf))
+        os.makedirs(diretorio_uf)
+        for arquivo in os.listdir(origem_uf):
+            ligar_ou_copiar(os.path.join(origem_uf, arquivo), os.path.join(diretorio_uf, arquivo))
+    with open(os.path.join(temporario, MARCADOR_CONCLUIDO), "w", encoding="utf-8") as f:
+        f.write(str(VERSAO_ESQUEMA))
+
+    shutil.rmtree(destino, ignore_errors=True)
+    os.replace(temporario, destino)
+
+
+def registrar_dataset(nome, conteudo_hash, arquivo_origem, linhas=None, atualizacao=None):
+    """Associa um nome de dataset a um conteúdo e remove conteúdos que ficaram sem referência.
+
+    Quem grava o conteúdo deve chamá-la ainda com `lock_repositorio` adquirido.
+
+    `atualizacao` é o resumo da atualização incremental que produziu o conteúdo, se houver.
+    """
+    info = os.stat(arquivo_origem)
+    with lock_repositorio:
+        manifesto = ler_manifesto()
+        manifesto["datasets"][nome] = {
+            "hash": conteudo_hash,
+            "arquivo_origem": arquivo_origem,
+            "mtime_ns": info.st_mtime_ns,
+            "tamanho": info.st_size,
+            "linhas": linhas if linhas is not None else manifesto["datasets"].get(nome, {}).get("linhas"),
+            "ingerido_em": datetime.datetime.now().isoformat(timespec="seconds"),
+            "atualizacao": atualizacao,
+        }
+        _salvar_manifesto(manifesto)
+
+        referenciados = {registro["hash"] for registro in manifesto["datasets"].values()}
+        for entrada in os.listdir(DATASETS_DIR):
+            caminho = os.path.join(DATASETS_DIR, entrada)
+            if os.path.isdir(caminho) and entrada not in referenciados and not entrada.endswith(".tmp"):
+                shutil.rmtree(caminho, ignore_errors=True)
+
+
+def obter_dataset(nome):
+    """Retorna o registro do manifesto para o dataset, ou None se não existir."""
+    return ler_manifesto()["datasets"].get(nome)
+
+
+def listar_datasets():
+    """Lista os nomes dos datasets já convertidos para Parquet."""
+    return sorted(nome for nome, registro in ler_manifesto()["datasets"].items() if dataset_existe(registro["hash"]))
+
+
+def ler_dataset(conteudo_hash, colunas=None, ufs=None, anos=None):
+    """Lê apenas as colunas e partições (UF e ano) necessárias de um dataset."""
+    dataset = ds.dataset(caminho_dataset(conteudo_hash), format="parquet", partitioning=PARTICIONAMENTO)
+
+    filtro = None
+    if ufs is not None:
+        filtro = ds.field("SigUFPrincipal").isin(list(ufs))
+    if anos is not None:
+        filtro_anos = ds.field(COLUNA_ANO_PARTICAO).isin([int(ano) for ano in anos])
+        filtro = filtro_anos if filtro is None else filtro & filtro_anos
+
+    if colunas is not None:
+        colunas = [col for col in colunas if col in dataset.schema.names]
+    else:
+        colunas = [col for col in dataset.schema.names if col != COLUNA_ANO_PARTICAO]
+    return dataset.to_table(columns=colunas, filter=filtro).to_pandas()
@@ -0,0 +1,182 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+import armazenamento
+from agregados import cache_cubos
+from cache_lru import assinar, assinatura_de
+from data_loader import (cache_dados, adicionar_colunas_derivadas, carregar_dataset, chave_dataset,
+                         concatenar_dados, hash_arquivo, ingerir_arquivo, processar_arquivo)
+from instrumentacao import instrumentar
+
+# 🔄 Atualização incremental: um novo snapshot do SIGA é comparado ao anterior pelo código CEG e
+# só as usinas incluídas, removidas ou alteradas são aplicadas ao dataset e às estruturas derivadas
+COLUNA_CHAVE = "CodCEG"
+MAX_CODIGOS_RELATORIO = int(os.environ.get("MAX_CODIGOS_RELATORIO", "20"))  # CEGs listados por tipo de mudança
+
+
+def valores_diferentes(anterior, novo):
+    """Máscara das posições em que duas séries alinhadas diferem (ausente é igual a ausente)."""
+    if isinstance(anterior.dtype, pd.CategoricalDtype):
+        # Compara códigos, traduzindo as categorias do anterior para as do novo (-2: inexistente no novo)
+        traducao = pd.Index(novo.cat.categories).get_indexer(anterior.cat.categories)
+        traducao = np.append(np.where(traducao < 0, -2, traducao), -1)
+        return traducao[anterior.cat.codes.to_numpy()] != novo.cat.codes.to_numpy()
+    anterior = anterior.reset_index(drop=True)
+    novo = novo.reset_index(drop=True)
+    diferentes = (anterior != novo) & ~(anterior.isna() & novo.isna())
+    return diferentes.to_numpy(dtype=bool)
+
+
+def indice_ceg(df):
+    """Índice dos códigos CEG do snapshot, ou None se houver códigos ausentes ou duplicados."""
+    if COLUNA_CHAVE not in df.columns:
+        return None
+    indice = pd.Index(df[COLUNA_CHAVE])
+    return indice if indice.is_unique and not indice.hasnans else None
+
+
+class DiferencaSnapshot:
+    """Usinas incluídas, removidas e alteradas entre dois snapshots, casadas pelo código CEG.
+
+    Guarda posições: `removidas` e `alteradas_anterior` no snapshot anterior, `incluidas` e
+    `alteradas_novo` no novo (as duas listas de alteradas estão pareadas).
+    """
+
+    def __init__(self, anterior, novo, colunas, indice_anterior=None):
+        indice_anterior = indice_ceg(anterior) if indice_anterior is None else indice_anterior
+        posicoes = indice_anterior.get_indexer(novo[COLUNA_CHAVE])
+        presentes = posicoes >= 0
+        self.incluidas = np.flatnonzero(~presentes)
+
+        mantidas = np.zeros(len(anterior), dtype=bool)
+        mantidas[posicoes[presentes]] = True
+        self.removidas = np.flatnonzero(~mantidas)
+
+        # Usinas presentes nos dois snapshots, comparadas coluna a coluna
+        novo_presentes = np.flatnonzero(presentes)
+        anterior_presentes = posicoes[presentes]
+        diferentes = {col: valores_diferentes(anterior[col].iloc[anterior_presentes], novo[col].iloc[novo_presentes])
+                      for col in colunas}
+        alteradas = np.zeros(len(novo_presentes), dtype=bool)
+        for mascara in diferentes.values():
+            alteradas |= mascara
+        self.alteradas_novo = novo_presentes[alteradas]
+        self.alteradas_anterior = anterior_presentes[alteradas]
+        self.colunas_alteradas = {col: int(mascara.sum()) for col, mascara in diferentes.items() if mascara.any()}
+
+
+def ufs_de(*dfs):
+    """UFs presentes nos DataFrames (None para UF ausente)."""
+    return {None if pd.isna(uf) else uf for df in dfs for uf in df["SigUFPrincipal"].unique()}
+
+
+def ordenar_como_dataset(df):
+    """Linhas na ordem da leitura do dataset gravado: UF (sem UF por último) e ano de início, estável.
+
+    É a ordem de `armazenamento.escrever_dataset`; com ela, o DataFrame guardado no cache é idêntico ao
+    relido do Parquet após um despejo, e as estruturas posicionais (máscaras, ordens) continuam válidas.
+    """
+    chaves = pd.DataFrame({"uf": df["SigUFPrincipal"].astype("string"),
+                           "ano": df["DatInicioVigencia"].dt.year}).reset_index(drop=True)
+    ordem = chaves.sort_values(["uf", "ano"], kind="stable", na_position="last").index
+    return df.iloc[ordem].reset_index(drop=True)
+
+
+def codigos(df, posicoes):
+    """Primeiros códigos CEG das posições, para o relatório."""
+    return df[COLUNA_CHAVE].iloc[posicoes[:MAX_CODIGOS_RELATORIO]].tolist()
+
+
+@instrumentar()
+def ingerir_snapshot(file_path, nome=None):
+    """Ingere um CSV do SIGA; se o nome já tiver um snapshot anterior, aplica apenas a diferença.
+
+    A leitura do CSV e a comparação por CEG percorrem o snapshot inteiro; o restante (Parquet, dataset
+    em cache e cubo agregado) é proporcional às usinas alteradas. Retorna o relatório da atualização,
+    ou None quando a ingestão é completa (primeiro snapshot, conteúdo já ingerido, esquema antigo ou
+    códigos CEG ausentes/duplicados).
+    """
+    inicio = time.perf_counter()
+    nome = nome or os.path.basename(file_path)
+    conteudo_hash, _ = hash_arquivo(file_path)
+    registro = armazenamento.obter_dataset(nome)
+    if (armazenamento.dataset_existe(conteudo_hash) or registro is None
+            or not armazenamento.dataset_existe(registro["hash"])):
+        ingerir_arquivo(file_path, nome)
+        return None
+
+    hash_anterior = registro["hash"]
+    novo = processar_arquivo(file_path)
+    anterior = carregar_dataset(hash_anterior)
+    colunas = [col for col in novo.columns if col != COLUNA_CHAVE]
+    indice_anterior = indice_ceg(anterior) if all(col in anterior.columns for col in colunas) else None
+    if indice_anterior is None or indice_ceg(novo) is None:
+        with armazenamento.lock_repositorio:
+            armazenamento.escrever_dataset(novo, conteudo_hash)
+            armazenamento.registrar_dataset(nome, conteudo_hash, file_path, len(novo))
+        return None
+
+    diferenca = DiferencaSnapshot(anterior, novo, colunas, indice_anterior)
+    saindo = np.concatenate([diferenca.removidas, diferenca.alteradas_anterior])
+    entrando = np.concatenate([diferenca.incluidas, diferenca.alteradas_novo])
+
+    # 🧮 Dataset atualizado: linhas mantidas + linhas novas (colunas derivadas só para estas),
+    # com os tipos do dataset gravado para que as partições novas e as reaproveitadas coincidam
+    mantidas = np.ones(len(anterior), dtype=bool)
+    mantidas[saindo] = False
+    removidas = anterior.iloc[saindo]
+    incluidas = adicionar_colunas_derivadas(novo.iloc[entrando].reset_index(drop=True))
+    incluidas = incluidas[anterior.columns].astype(
+        {col: anterior[col].dtype for col in anterior.columns if anterior[col].dtype != "category"})
+    atualizado = ordenar_como_dataset(concatenar_dados([anterior[mantidas], incluidas]))
+
+    # 📦 Parquet: só as partições das UFs afetadas são regravadas; as demais são ligadas às anteriores
+    ufs_afetadas = ufs_de(removidas, incluidas)
+    ufs_atualizado = atualizado["SigUFPrincipal"]
+    afetadas = ufs_atualizado.isin([uf for uf in ufs_afetadas if uf is not None])
+    if None in ufs_afetadas:
+        afetadas |= ufs_atualizado.isna()
+
+    relatorio = {
+        "nome": nome,
+        "hash_anterior": hash_anterior,
+        "hash_novo": conteudo_hash,
+        "usinas_anteriores": len(anterior),
+        "usinas": len(atualizado),
+        "incluidas": len(diferenca.incluidas),
+        "removidas": len(diferenca.removidas),
+        "alteradas": len(diferenca.alteradas_novo),
+        "colunas_alteradas": diferenca.colunas_alteradas,
+        "ufs_regravadas": sorted(uf or "(sem UF)" for uf in ufs_afetadas),
+        "codigos": {
+            "incluidas": codigos(novo, diferenca.incluidas),
+            "removidas": codigos(anterior, diferenca.removidas),
+            "alteradas": codigos(novo, diferenca.alteradas_novo),
+        },
+    }
+    # Gravação e registro sob o lock do repositório: a limpeza de conteúdos sem referência não
+    # remove a base durante a ligação das partições nem o conteúdo novo antes do registro
+    with armazenamento.lock_repositorio:
+        ufs_reaproveitadas = []
+        if armazenamento.dataset_existe(hash_anterior):
+            ufs_reaproveitadas = [uf for uf in armazenamento.ufs_do_dataset(hash_anterior) if uf not in ufs_afetadas]
+            armazenamento.escrever_dataset(atualizado.loc[afetadas, novo.columns], conteudo_hash,
+                                           base=hash_anterior, ufs_reaproveitadas=ufs_reaproveitadas)
+        else:
+            # A base foi substituída e removida enquanto o snapshot era comparado: grava tudo
+            armazenamento.escrever_dataset(atualizado[novo.columns], conteudo_hash)
+        relatorio["ufs_reaproveitadas"] = len(ufs_reaproveitadas)
+        relatorio["segundos"] = round(time.perf_counter() - inicio, 3)
+        armazenamento.registrar_dataset(nome, conteudo_hash, file_path, len(atualizado), atualizacao=relatorio)
+
+    # 🗄️ Estruturas derivadas: o dataset e o cubo entram no cache sob o novo conteúdo
+    # (o índice de filtros é reconstruído sob demanda: uma ordenação por coluna, sem agrupamentos)
+    cubo = cache_cubos.obter(assinatura_de(anterior))
+    chave = chave_dataset(conteudo_hash)
+    cache_dados.guardar(chave, assinar(atualizado, chave))
+    if cubo is not None:
+        cache_cubos.guardar(chave, cubo.atualizado(removidas, incluidas))
+    cache_dados.invalidar(lambda c: isinstance(c, tuple) and c[:3] == chave[:2] + (hash_anterior,))
+    cache_cubos.invalidar(lambda c: isinstance(c, tuple) and c[:3] == chave[:2] + (hash_anterior,))
+    return relatorio
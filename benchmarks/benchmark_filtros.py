@@ -0,0 +1,80 @@
+"""Micro-benchmark: varredura completa (implementação anterior de aplicar_filtros) x IndiceFiltros.
+
+Os tempos incluem a seleção das linhas (df[mascara]), como em aplicar_filtros.
+
+Uso (na raiz do projeto):
+    python -m benchmarks.benchmark_filtros --linhas 10000 100000 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from filters import IndiceFiltros
+
+UFS = ["SP", "MG", "RJ", "PR", "RS", "SC", "BA", "GO", "MT", "MS", "PE", "CE", "PA", "AM", "TO", "MA", "PI"]
+ORIGENS = ["Biomassa", "Fóssil", "Hídrica", "Eólica", "Solar", "Nuclear"]
+FONTES = ["Bagaço de Cana de Açúcar", "Gás Natural", "Potencial hidráulico", "Cinética do vento", "Radiação solar",
+          "Óleo Diesel", "Resíduos Florestais", "Urânio"]
+
+
+def gerar_dataframe(linhas, semente=42):
+    """DataFrame sintético com as colunas usadas pelos filtros."""
+    rng = np.random.default_rng(semente)
+    datas = pd.to_datetime("1950-01-01") + pd.to_timedelta(rng.integers(0, 75 * 365, linhas), unit="D")
+    df = pd.DataFrame({
+        "DatInicioVigencia": datas,
+        "DscOrigemCombustivel": pd.Categorical(rng.choice(ORIGENS, linhas)),
+        "NomFonteCombustivel": pd.Categorical(rng.choice(FONTES, linhas)),
+        "SigUFPrincipal": pd.Categorical(rng.choice(UFS, linhas)),
+    })
+    df["ChaveAnoMes"] = (datas.year * 12 + datas.month).astype("int32")
+    return df
+
+
+def filtrar_por_varredura(df, inicio_data_num, fim_data_num, origens, fontes, estados):
+    """Implementação anterior: dt.year/dt.month recalculados e três `isin` sobre o DataFrame inteiro."""
+    df_data_num = df["DatInicioVigencia"].dt.year * 12 + df["DatInicioVigencia"].dt.month
+    return df[
+        (df_data_num >= inicio_data_num) &
+        (df_data_num <= fim_data_num) &
+        (df["DscOrigemCombustivel"].isin(origens)) &
+        (df["NomFonteCombustivel"].isin(fontes)) &
+        (df["SigUFPrincipal"].isin(estados))
+    ]
+
+
+def cronometrar(funcao, repeticoes):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao()
+    return (time.perf_counter() - inicio) / repeticoes * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeticoes", type=int, default=20)
+    args = parser.parse_args()
+
+    filtros = (1990 * 12 + 1, 2010 * 12 + 12, ["Biomassa", "Solar"], ["Bagaço de Cana de Açúcar", "Radiação solar"], UFS[:10])
+    print(f"{'linhas':>10} | {'varredura':>10} | {'índice (máscara nova)':>22} | {'índice (memorizado)':>20} | construção")
+    for linhas in args.linhas:
+        df = gerar_dataframe(linhas)
+        inicio = time.perf_counter()
+        indice = IndiceFiltros(df, max_mascaras=0)
+        construcao = (time.perf_counter() - inicio) * 1000
+
+        t_varredura = cronometrar(lambda: filtrar_por_varredura(df, *filtros), args.repeticoes)
+        t_indice = cronometrar(lambda: df[indice.mascara(*filtros)], args.repeticoes)
+        indice_memo = IndiceFiltros(df)
+        indice_memo.mascara(*filtros)
+        t_memo = cronometrar(lambda: df[indice_memo.mascara(*filtros)], args.repeticoes)
+
+        assert np.array_equal(filtrar_por_varredura(df, *filtros).index.to_numpy(), np.flatnonzero(indice.mascara(*filtros)))
+        print(f"{linhas:>10} | {t_varredura:>8.2f}ms | {t_indice:>20.2f}ms | {t_memo:>18.2f}ms | {construcao:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Benchmark: inferência por permutação do Moran global + LISA — esda x inferencia_esda.
+
+Para cada tamanho mede o `esda` (Moran + Moran_Local), o motor esparso sem parada antecipada,
+com parada antecipada e com pool de processos. A concordância é medida pelo I global, pelos
+quadrantes e pelo número de usinas significativas a 0,05 (diferenças dentro do erro de Monte Carlo).
+
+Uso (na raiz do projeto):
+    python -m benchmarks.benchmark_inferencia --usinas 2000 10000 20000 --distancia-km 50
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+from esda.moran import Moran, Moran_Local
+
+from benchmarks.benchmark_vizinhanca import gerar_coordenadas
+from inferencia_esda import inferencia_moran
+from pesos_espaciais import construir_pesos
+
+
+def gerar_valores(coords, semente=42):
+    """Potências sintéticas (log-normais) com um gradiente leste-oeste, para haver autocorrelação."""
+    rng = np.random.default_rng(semente)
+    return np.exp(rng.normal(size=len(coords))) * 1000 + (coords[:, 0] > -47) * 800
+
+
+def cronometrar(funcao):
+    inicio = time.perf_counter()
+    resultado = funcao()
+    return resultado, time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--usinas", type=int, nargs="+", default=[2_000, 10_000, 20_000])
+    parser.add_argument("--distancia-km", type=float, default=50)
+    parser.add_argument("--permutacoes", type=int, default=999)
+    parser.add_argument("--processos", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--sem-esda", action="store_true", help="não executa a referência do esda")
+    args = parser.parse_args()
+
+    print(f"distância: {args.distancia_km:g} km | permutações: {args.permutacoes} | processos: {args.processos}")
+    print(f"{'usinas':>7} | {'viz.':>5} | {'variante':>26} | {'tempo':>7} | {'I':>8} | {'p global':>8} | "
+          f"{'signif.':>7} | {'perm. médias':>12}")
+    for usinas in args.usinas:
+        coords = gerar_coordenadas(usinas)
+        y = gerar_valores(coords)
+        w = construir_pesos(coords, args.distancia_km)
+
+        linhas = []
+        if not args.sem_esda:
+            (moran, lisa), t = cronometrar(lambda: (Moran(y, w, permutations=args.permutacoes),
+                                                    Moran_Local(y, w, permutations=args.permutacoes, seed=1)))
+            linhas.append(("esda", t, moran.I, moran.p_sim, (lisa.p_sim < 0.05).sum(), args.permutacoes))
+            quadrantes_esda = lisa.q
+
+        variantes = [
+            ("esparso", dict(parada_antecipada=False, processos=1)),
+            ("esparso + parada", dict(parada_antecipada=True, processos=1)),
+            (f"esparso + parada + {args.processos} proc.", dict(parada_antecipada=True, processos=args.processos)),
+        ]
+        for nome, opcoes in variantes:
+            r, t = cronometrar(lambda: inferencia_moran(y, w, permutacoes=args.permutacoes, **opcoes))
+            linhas.append((nome, t, r.I, r.p_sim, (r.p_sim_local < 0.05).sum(), r.permutacoes_usadas.mean()))
+            if not args.sem_esda:
+                assert np.isclose(r.I, moran.I) and np.array_equal(r.q, quadrantes_esda)
+
+        for nome, t, I, p, significativas, perm in linhas:
+            print(f"{usinas:>7} | {w.mean_neighbors:>5.1f} | {nome:>26} | {t:>6.2f}s | {I:>8.4f} | {p:>8.3f} | "
+                  f"{significativas:>7} | {perm:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
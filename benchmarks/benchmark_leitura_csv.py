@@ -0,0 +1,66 @@
+"""Compara os motores de leitura de CSV (pandas x pyarrow) em tempo e pico de memória.
+
+Uso (na raiz do projeto):
+    python -m benchmarks.benchmark_leitura_csv uploaded_files/siga-empreendimentos-geracao.csv --replicar 8
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+from data_loader import LEITORES_CSV, processar_arquivo
+
+
+def replicar_csv(origem, vezes):
+    """Gera um CSV temporário com o cabeçalho de `origem` e suas linhas repetidas `vezes` vezes."""
+    with open(origem, "rb") as f:
+        cabecalho = f.readline()
+        corpo = f.read()
+    if not corpo.endswith(b"\n"):
+        corpo += b"\n"
+    destino = tempfile.NamedTemporaryFile(suffix=".csv", delete=False)
+    with destino:
+        destino.write(cabecalho)
+        for _ in range(vezes):
+            destino.write(corpo)
+    return destino.name
+
+
+def _medir(caminho, motor, fila):
+    inicio = time.perf_counter()
+    df = processar_arquivo(caminho, motor)
+    duracao = time.perf_counter() - inicio
+    fila.put((duracao, len(df), resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+
+def medir_motor(caminho, motor):
+    """Executa a leitura em um processo novo e retorna (segundos, linhas, pico de RSS em MB)."""
+    fila = multiprocessing.Queue()
+    processo = multiprocessing.Process(target=_medir, args=(caminho, motor, fila))
+    processo.start()
+    resultado = fila.get()
+    processo.join()
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("arquivo", help="CSV do SIGA usado como base")
+    parser.add_argument("--replicar", type=int, default=1, help="quantas vezes repetir as linhas do arquivo")
+    args = parser.parse_args()
+
+    caminho = replicar_csv(args.arquivo, args.replicar) if args.replicar > 1 else args.arquivo
+    try:
+        print(f"Arquivo: {caminho} ({os.path.getsize(caminho) / 1024 ** 2:.1f} MB)")
+        for motor in LEITORES_CSV:
+            duracao, linhas, pico_mb = medir_motor(caminho, motor)
+            print(f"{motor:>8}: {duracao:6.2f} s | {linhas} linhas em Operação | pico RSS {pico_mb:7.1f} MB")
+    finally:
+        if caminho != args.arquivo:
+            os.remove(caminho)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""Suíte de benchmarks do painel, sem Streamlit, sobre CSVs sintéticos do SIGA.
+
+Para cada tamanho gera um CSV (benchmarks.gerador_siga) em um diretório temporário e mede as
+etapas de uma execução do painel: ingestão, carga (fria e quente), índice e aplicação dos filtros,
+cubo agregado e as agregações de cada gráfico, construção e serialização dos mapas, a ESDA
+(pontual em amostra, hexagonal e correlograma) e a chegada de um novo snapshot (reingestão completa
+x atualização incremental). Cada etapa é repetida e a mediana é registrada.
+
+Os resultados vão para um JSON (--saida); com --comparar, cada etapa é comparada com a mesma
+etapa/tamanho de um resultado anterior e o processo termina com código 1 se alguma ficou mais
+lenta que a tolerância.
+
+Uso (na raiz do projeto):
+    python -m benchmarks.benchmark_painel --linhas 10000 100000 1000000 --saida base.json
+    python -m benchmarks.benchmark_painel --linhas 10000 100000 --comparar base.json
+"""
+import argparse
+import datetime
+import itertools
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.gerador_siga import alterar_snapshot, gerar_csv_siga, gerar_dataframe_siga, gravar_csv_siga
+from agregados import (CuboAgregado, cache_cubos, fatiar_cubo, indicadores, obter_cubo, reduzir_series, serie_temporal,
+                       soma_por)
+from atualizacao_incremental import ingerir_snapshot
+from cache_lru import assinar
+from data_loader import cache_dados, carregar_dados, ingerir_arquivo
+from esda_analysis import cache_esda, obter_correlograma, obter_resultado_esda
+from file_manager import UPLOAD_DIR
+from filters import IndiceFiltros, aplicar_filtros, cache_indices
+from pesos_espaciais import cache_pesos
+from visualizations import PONTOS_MAXIMOS_GRAFICO, construir_mapa_usinas
+
+NOME_ARQUIVO = "siga-sintetico.csv"
+NOME_ARQUIVO_COMPLETO = "siga-sintetico-completo.csv"
+
+
+def cronometrar(funcao, repeticoes, preparar=None):
+    """Mediana e mínimo, em segundos, de `repeticoes` chamadas (com `preparar()` fora da medição)."""
+    tempos = []
+    for _ in range(repeticoes):
+        if preparar is not None:
+            preparar()
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return statistics.median(tempos), min(tempos)
+
+
+def filtros_completos(df):
+    """Filtro que mantém todo o período e todas as categorias (o pior caso para as etapas seguintes)."""
+    datas = df["DatInicioVigencia"].dropna()
+    return (datas.min().year * 12 + 1, datas.max().year * 12 + 12,
+            df["DscOrigemCombustivel"].cat.categories.tolist(), df["NomFonteCombustivel"].cat.categories.tolist(),
+            df["SigUFPrincipal"].cat.categories.tolist())
+
+
+_variacoes = itertools.count(1)
+
+
+def variar_filtro(filtros):
+    """O mesmo filtro com o fim do período recuado em alguns meses: uma chave nova, sem máscara memorizada."""
+    inicio, fim, origens, fontes, estados = filtros
+    return inicio, fim - next(_variacoes), origens, fontes, estados
+
+
+def limpar_esda():
+    cache_esda.limpar()
+    cache_pesos.limpar()
+
+
+def etapas(linhas, args):
+    """Gera o CSV de `linhas` usinas e devolve [(etapa, mediana, mínimo)] das etapas do painel."""
+    repeticoes = args.repeticoes
+    resultados = []
+
+    def medir(etapa, funcao, vezes=repeticoes, preparar=None):
+        mediana, minimo = cronometrar(funcao, vezes, preparar)
+        resultados.append((etapa, mediana, minimo))
+        print(f"{linhas:>9} | {etapa:<34} | {mediana:>8.3f}s | {minimo:>8.3f}s", flush=True)
+
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    caminho = os.path.join(UPLOAD_DIR, NOME_ARQUIVO)
+    gerar_csv_siga(caminho, linhas, args.semente)
+
+    # 🧱 Ingestão e carga (a ingestão só acontece uma vez por arquivo)
+    medir("ingerir_arquivo", lambda: ingerir_arquivo(caminho), vezes=1)
+    medir("carregar_dados (frio)", lambda: carregar_dados([NOME_ARQUIVO]), preparar=cache_dados.limpar)
+    medir("carregar_dados (quente)", lambda: carregar_dados([NOME_ARQUIVO]))
+    df = carregar_dados([NOME_ARQUIVO])
+
+    # 🔍 Filtros e cubo agregado: construção (uma vez por dataset) e uso a cada rerun
+    filtros = filtros_completos(df)
+    aplicar_filtros(df, filtros)  # índice e cubo ficam em cache, como depois do primeiro rerun
+    fatiar_cubo(df, filtros)
+    medir("indice_filtros (construção)", lambda: IndiceFiltros(df))
+    medir("aplicar_filtros", lambda: aplicar_filtros(df, variar_filtro(filtros)))
+    medir("cubo_agregado (construção)", lambda: CuboAgregado(df))
+    medir("fatiar_cubo", lambda: fatiar_cubo(df, variar_filtro(filtros)))
+    df_filtrado = aplicar_filtros(df, filtros)
+    celulas = fatiar_cubo(df, filtros)
+
+    # 📊 Agregações por trás de cada gráfico
+    medir("grafico: indicadores", lambda: indicadores(celulas))
+    medir("grafico: temporal (mês + LTTB)",
+          lambda: reduzir_series(serie_temporal(celulas, "Mês"), PONTOS_MAXIMOS_GRAFICO))
+    medir("grafico: barras por UF", lambda: soma_por(celulas, "SigUFPrincipal"))
+    medir("grafico: barras por ano", lambda: soma_por(celulas, "Ano"))
+
+    # 🗺️ Mapas: construção do Folium e serialização do HTML
+    validas = df_filtrado[df_filtrado["CoordenadaValida"]]
+    for tipo_mapa in ["Mapa Normal", "Mapa de Calor"]:
+        medir(f"mapa: {tipo_mapa.lower()}",
+              lambda: construir_mapa_usinas(validas, tipo_mapa)[0].get_root().render(), vezes=args.repeticoes_esda)
+
+    # 📌 ESDA: pontual em uma amostra (limite do painel), hexagonal e correlograma, sempre a frio
+    amostra = validas.sample(min(len(validas), args.usinas_esda), random_state=args.semente)
+    assinar(amostra, ("benchmark", linhas, len(amostra)))
+    medir(f"esda: usinas ({len(amostra)}, {args.distancia_km:g} km)",
+          lambda: obter_resultado_esda(amostra, distancia_km=args.distancia_km, permutacoes=args.permutacoes),
+          vezes=args.repeticoes_esda, preparar=limpar_esda)
+    medir("esda: hexágonos (50 km)",
+          lambda: obter_resultado_esda(df_filtrado, unidade="hexagono", permutacoes=args.permutacoes),
+          vezes=args.repeticoes_esda, preparar=limpar_esda)
+    medir("esda: correlograma (25-500 km)",
+          lambda: obter_correlograma(amostra, range(25, 525, 25)), vezes=args.repeticoes_esda, preparar=limpar_esda)
+
+    # 🔄 Novo snapshot com parte das usinas incluída, removida ou alterada: reingestão completa (com carga
+    # fria e cubo) x atualização incremental do dataset já carregado. Uma vez cada, pois alteram o estado.
+    base = gerar_dataframe_siga(linhas, args.semente)
+    gravar_csv_siga(alterar_snapshot(base, args.fracao_snapshot, args.semente + 1),
+                    os.path.join(UPLOAD_DIR, NOME_ARQUIVO_COMPLETO))
+    medir("snapshot: ingestão completa",
+          lambda: (ingerir_arquivo(os.path.join(UPLOAD_DIR, NOME_ARQUIVO_COMPLETO)),
+                   obter_cubo(carregar_dados([NOME_ARQUIVO_COMPLETO]))), vezes=1)
+    gravar_csv_siga(alterar_snapshot(base, args.fracao_snapshot, args.semente + 2), caminho)
+    medir(f"snapshot: incremental ({args.fracao_snapshot:.1%})",
+          lambda: (ingerir_snapshot(caminho), obter_cubo(carregar_dados([NOME_ARQUIVO]))), vezes=1)
+
+    for cache in (cache_dados, cache_indices, cache_cubos):
+        cache.limpar()
+    limpar_esda()
+    return resultados
+
+
+def comparar(atual, base, tolerancia, minimo_segundos):
+    """Imprime a razão atual/base por etapa e devolve quantas etapas regrediram além da tolerância."""
+    anteriores = {(m["linhas"], m["etapa"]): m["segundos"] for m in base["medicoes"]}
+    regressoes = 0
+    print(f"\n{'linhas':>9} | {'etapa':<34} | {'base':>8} | {'atual':>8} | {'razão':>6}")
+    for m in atual["medicoes"]:
+        anterior = anteriores.get((m["linhas"], m["etapa"]))
+        if anterior is None:
+            continue
+        razao = m["segundos"] / anterior if anterior else float("inf")
+        situacao = ""
+        if max(m["segundos"], anterior) >= minimo_segundos:
+            if razao > 1 + tolerancia:
+                situacao = "⚠️ regressão"
+                regressoes += 1
+            elif razao < 1 / (1 + tolerancia):
+                situacao = "✅ melhora"
+        print(f"{m['linhas']:>9} | {m['etapa']:<34} | {anterior:>7.3f}s | {m['segundos']:>7.3f}s | "
+              f"{razao:>5.2f}x {situacao}")
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeticoes", type=int, default=5, help="repetições das etapas rápidas")
+    parser.add_argument("--repeticoes-esda", type=int, default=2, help="repetições dos mapas e da ESDA")
+    parser.add_argument("--usinas-esda", type=int, default=10_000, help="amostra da ESDA pontual")
+    parser.add_argument("--distancia-km", type=float, default=100)
+    parser.add_argument("--permutacoes", type=int, default=999)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--fracao-snapshot", type=float, default=0.01,
+                        help="fração das usinas alterada (e também removida e incluída) no novo snapshot")
+    parser.add_argument("--saida", default="benchmark_painel.json", help="arquivo JSON com os resultados")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior usado como referência")
+    parser.add_argument("--tolerancia", type=float, default=0.25, help="aumento relativo tolerado (0,25 = 25%%)")
+    parser.add_argument("--minimo-segundos", type=float, default=0.01,
+                        help="etapas mais rápidas que isso nos dois lados não contam como regressão")
+    args = parser.parse_args()
+    saida = os.path.abspath(args.saida)
+    base = None
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            base = json.load(f)
+
+    resultado = {
+        "metadados": {
+            "data": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "plataforma": platform.platform(),
+            "cpus": os.cpu_count(),
+            "parametros": {k: v for k, v in vars(args).items() if k not in ("saida", "comparar")},
+        },
+        "medicoes": [],
+    }
+
+    print(f"{'linhas':>9} | {'etapa':<34} | {'mediana':>9} | {'mínimo':>9}")
+    diretorio_original = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="benchmark_painel_") as diretorio:
+        # uploaded_files/ e datasets/ são relativos ao diretório de trabalho
+        os.chdir(diretorio)
+        try:
+            for linhas in args.linhas:
+                for etapa, mediana, minimo in etapas(linhas, args):
+                    resultado["medicoes"].append({"linhas": linhas, "etapa": etapa, "segundos": round(mediana, 5),
+                                                  "minimo": round(minimo, 5)})
+        finally:
+            os.chdir(diretorio_original)
+
+    with open(saida, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+    print(f"\nResultados gravados em {saida}")
+
+    if base is not None and comparar(resultado, base, args.tolerancia, args.minimo_segundos):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Benchmark: busca de vizinhos da banda de distância por método (graus, geodésica, projetada).
+
+Para cada tamanho mede o tempo da busca de pares, o tempo até o W pronto e o número médio
+de vizinhos, e compara os pares de cada método com os da distância geodésica (a referência):
+"faltando" são vizinhos reais perdidos, "sobrando" são pares que não estão dentro do raio.
+
+Uso (na raiz do projeto):
+    python -m benchmarks.benchmark_vizinhanca --usinas 10000 50000 100000 --distancia-km 50
+"""
+import argparse
+import time
+
+import numpy as np
+
+from pesos_espaciais import METODOS_VIZINHANCA, matriz_para_pesos
+
+# Caixa aproximada do território brasileiro (longitude, latitude)
+LON_MIN, LON_MAX = -73.9, -34.8
+LAT_MIN, LAT_MAX = -33.7, 5.2
+
+
+def gerar_coordenadas(usinas, semente=42):
+    """Coordenadas sintéticas: metade uniforme na caixa do Brasil, metade concentrada em polos regionais."""
+    rng = np.random.default_rng(semente)
+    uniforme = usinas // 2
+    polos = rng.uniform([LON_MIN + 5, LAT_MIN + 3], [LON_MAX - 2, LAT_MAX - 3], size=(40, 2))
+    escolhidos = polos[rng.integers(0, len(polos), usinas - uniforme)]
+    return np.vstack([
+        np.column_stack([rng.uniform(LON_MIN, LON_MAX, uniforme), rng.uniform(LAT_MIN, LAT_MAX, uniforme)]),
+        escolhidos + rng.normal(0, 1.0, escolhidos.shape),
+    ])
+
+
+def chaves_pares(pares, n):
+    """Identificador único (i < j) de cada par, para comparar conjuntos de vizinhos."""
+    pares = np.sort(pares, axis=1).astype("int64")
+    return pares[:, 0] * n + pares[:, 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--usinas", type=int, nargs="+", default=[10_000, 50_000, 100_000])
+    parser.add_argument("--distancia-km", type=float, default=50)
+    parser.add_argument("--sem-w", action="store_true", help="mede apenas a busca de pares (sem montar o W)")
+    args = parser.parse_args()
+
+    print(f"distância: {args.distancia_km:g} km")
+    print(f"{'usinas':>8} | {'método':>10} | {'pares':>10} | {'busca':>9} | {'W pronto':>9} | "
+          f"{'viz. médios':>11} | {'faltando':>9} | {'sobrando':>9}")
+    for usinas in args.usinas:
+        coords = gerar_coordenadas(usinas)
+        resultados = {}
+        for metodo, buscar in METODOS_VIZINHANCA.items():
+            inicio = time.perf_counter()
+            pares = buscar(coords, args.distancia_km)
+            t_busca = time.perf_counter() - inicio
+            t_w = float("nan")
+            if not args.sem_w:
+                matriz_para_pesos(pares, usinas)
+                t_w = time.perf_counter() - inicio
+            resultados[metodo] = (pares, t_busca, t_w)
+
+        referencia = chaves_pares(resultados["geodesica"][0], usinas)
+        for metodo, (pares, t_busca, t_w) in resultados.items():
+            chaves = chaves_pares(pares, usinas)
+            faltando = np.setdiff1d(referencia, chaves, assume_unique=True).size
+            sobrando = np.setdiff1d(chaves, referencia, assume_unique=True).size
+            print(f"{usinas:>8} | {metodo:>10} | {len(pares):>10} | {t_busca:>8.2f}s | {t_w:>8.2f}s | "
+                  f"{2 * len(pares) / usinas:>11.1f} | {faltando:>9} | {sobrando:>9}")
+
+
+if __name__ == "__main__":
+    main()
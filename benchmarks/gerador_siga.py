@@ -0,0 +1,160 @@
+"""Gerador de CSVs sintéticos no formato do SIGA (ANEEL) para benchmarks.
+
+Mesmas colunas do arquivo original, codificação latin1, delimitador `;`, coordenadas com vírgula
+decimal e potências com ponto decimal (como lidas por `data_loader.processar_arquivo`).
+UFs, origens/fontes, fases e potências seguem distribuições próximas às do SIGA; as
+coordenadas ficam em torno do centro de cada UF e ~2% das usinas não têm coordenadas.
+
+Uso (na raiz do projeto):
+    python -m benchmarks.gerador_siga siga-sintetico.csv --linhas 100000
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+COLUNAS = [
+    "DatGeracaoConjuntoDados", "NomEmpreendimento", "IdeNucleoCEG", "CodCEG", "SigUFPrincipal", "SigTipoGeracao",
+    "DscFaseUsina", "DscOrigemCombustivel", "DscFonteCombustivel", "DscTipoOutorga", "NomFonteCombustivel",
+    "DatEntradaOperacao", "MdaPotenciaOutorgadaKw", "MdaPotenciaFiscalizadaKw", "MdaGarantiaFisicaKw",
+    "IdcGeracaoQualificada", "NumCoordNEmpreendimento", "NumCoordEEmpreendimento", "DatInicioVigencia",
+    "DatFimVigencia", "DscPropriRegimePariticipacao", "DscSubBacia", "DscMuninicpios",
+]
+
+# UF: (peso, latitude e longitude aproximadas do centro)
+UFS = {
+    "MG": (18, -18.5, -44.6), "SP": (11, -22.3, -48.7), "BA": (9, -12.5, -41.7), "RS": (6, -29.8, -53.2),
+    "PR": (6, -24.6, -51.6), "RN": (6, -5.8, -36.6), "CE": (5, -5.1, -39.3), "GO": (5, -16.0, -49.6),
+    "PI": (4, -7.7, -42.7), "MT": (4, -12.9, -55.9), "SC": (4, -27.2, -50.4), "PE": (3, -8.3, -37.9),
+    "PB": (3, -7.1, -36.8), "MS": (3, -20.5, -54.8), "RJ": (3, -22.2, -42.7), "ES": (2, -19.6, -40.6),
+    "MA": (2, -5.0, -45.3), "PA": (2, -4.0, -52.5), "TO": (2, -10.2, -48.3), "AM": (1.5, -4.1, -63.1),
+    "RO": (1, -10.9, -62.8), "SE": (1, -10.6, -37.4), "AL": (1, -9.6, -36.6), "DF": (0.5, -15.8, -47.9),
+    "AC": (0.3, -9.0, -70.5), "AP": (0.3, 1.4, -51.8), "RR": (0.3, 2.1, -61.4),
+}
+
+# Origem: (peso, tipo de geração, fontes, mediana e dispersão log-normal da potência em kW)
+ORIGENS = {
+    "Solar": (45, "UFV", ["Radiação solar"], 3_000, 1.2),
+    "Fóssil": (15, "UTE", ["Óleo Diesel", "Gás Natural", "Carvão mineral", "Óleo Combustível"], 2_000, 2.0),
+    "Hídrica": (15, "PCH", ["Potencial hidráulico"], 5_000, 1.8),
+    "Eólica": (12, "EOL", ["Cinética do vento"], 25_000, 0.8),
+    "Biomassa": (12.9, "UTE", ["Bagaço de Cana de Açúcar", "Resíduos Florestais", "Biogás", "Licor Negro"], 10_000, 1.3),
+    "Nuclear": (0.1, "UTN", ["Urânio"], 1_000_000, 0.3),
+}
+FASES = {"Operação": 80, "Construção": 8, "Construção não iniciada": 12}
+OUTORGAS = {"Autorização": 85, "Concessão": 10, "Registro": 5}
+REGIMES = ["Autoprodução de Energia", "Produção Independente de Energia", "Serviço Público", "Registro"]
+FRACAO_SEM_COORDENADAS = 0.02
+
+
+def sortear(rng, distribuicao, n):
+    """Amostra `n` chaves de um dicionário {chave: peso} ou {chave: (peso, ...)}."""
+    chaves = list(distribuicao)
+    pesos = np.array([v[0] if isinstance(v, tuple) else v for v in distribuicao.values()], dtype="float64")
+    return np.array(chaves, dtype=object)[rng.choice(len(chaves), n, p=pesos / pesos.sum())]
+
+
+def decimal_virgula(valores, casas):
+    """Números formatados com vírgula decimal; NaN vira campo vazio."""
+    texto = pd.Series(np.round(valores, casas)).map(lambda v: f"{v:.{casas}f}".replace(".", ","))
+    return texto.where(~np.isnan(valores), "")
+
+
+def gerar_dataframe_siga(linhas, semente=42):
+    """DataFrame de texto com as colunas do SIGA, pronto para ser gravado como CSV."""
+    rng = np.random.default_rng(semente)
+    ufs = sortear(rng, UFS, linhas)
+    origens = sortear(rng, ORIGENS, linhas)
+
+    tipos = np.empty(linhas, dtype=object)
+    fontes = np.empty(linhas, dtype=object)
+    potencias = np.empty(linhas)
+    for origem, (_, tipo, opcoes, mediana, dispersao) in ORIGENS.items():
+        selecao = origens == origem
+        quantidade = int(selecao.sum())
+        tipos[selecao] = tipo
+        fontes[selecao] = np.array(opcoes, dtype=object)[rng.integers(0, len(opcoes), quantidade)]
+        potencias[selecao] = rng.lognormal(np.log(mediana), dispersao, quantidade)
+
+    centros = np.array([UFS[uf][1:] for uf in UFS])
+    indices_uf = pd.Index(list(UFS)).get_indexer(ufs)
+    latitudes = centros[indices_uf, 0] + rng.normal(0, 1.5, linhas)
+    longitudes = centros[indices_uf, 1] + rng.normal(0, 1.5, linhas)
+    sem_coordenadas = rng.random(linhas) < FRACAO_SEM_COORDENADAS
+    latitudes[sem_coordenadas] = np.nan
+    longitudes[sem_coordenadas] = np.nan
+
+    # Entrada em operação concentrada nos anos recentes (expansão solar e eólica)
+    dias = (75 * 365 * rng.beta(4, 1.5, linhas)).astype("int64")
+    inicio = pd.Timestamp("1950-01-01") + pd.to_timedelta(dias, unit="D")
+    data_inicio = pd.Series(inicio.strftime("%Y-%m-%d"))
+    data_operacao = pd.Series(inicio.to_period("M").to_timestamp().strftime("%Y-%m-%d"))
+
+    sequencia = pd.Series(np.arange(linhas)).map("{:06d}".format)
+    potencias_kw = np.round(potencias, 2)
+    return pd.DataFrame({
+        "DatGeracaoConjuntoDados": "2025-03-01",
+        "NomEmpreendimento": pd.Series(tipos) + " " + sequencia,
+        "IdeNucleoCEG": np.arange(1, linhas + 1),
+        "CodCEG": pd.Series(tipos) + ".XX." + pd.Series(ufs) + "." + sequencia + "-" + (sequencia.str[-1]) + ".01",
+        "SigUFPrincipal": ufs,
+        "SigTipoGeracao": tipos,
+        "DscFaseUsina": sortear(rng, FASES, linhas),
+        "DscOrigemCombustivel": origens,
+        "DscFonteCombustivel": fontes,
+        "DscTipoOutorga": sortear(rng, OUTORGAS, linhas),
+        "NomFonteCombustivel": fontes,
+        "DatEntradaOperacao": data_operacao,
+        "MdaPotenciaOutorgadaKw": potencias_kw,
+        "MdaPotenciaFiscalizadaKw": potencias_kw,
+        "MdaGarantiaFisicaKw": "",
+        "IdcGeracaoQualificada": "",
+        "NumCoordNEmpreendimento": decimal_virgula(latitudes, 6),
+        "NumCoordEEmpreendimento": decimal_virgula(longitudes, 6),
+        "DatInicioVigencia": data_inicio,
+        "DatFimVigencia": "",
+        "DscPropriRegimePariticipacao": np.array(REGIMES, dtype=object)[rng.integers(0, len(REGIMES), linhas)],
+        "DscSubBacia": "",
+        "DscMuninicpios": "Município - " + pd.Series(ufs),
+    }, columns=COLUNAS)
+
+
+def alterar_snapshot(df, fracao=0.01, semente=42):
+    """Próximo snapshot de `df`: `fracao` das usinas com potência alterada, outra `fracao` removida
+    e o mesmo número de usinas novas (códigos CEG inéditos) incluído."""
+    rng = np.random.default_rng(semente)
+    quantidade = max(1, int(len(df) * fracao))
+    sorteadas = df.index[rng.choice(len(df), 2 * quantidade, replace=False)]
+    alteradas, removidas = sorteadas[:quantidade], sorteadas[quantidade:]
+
+    novo = df.copy()
+    potencias = pd.to_numeric(novo.loc[alteradas, "MdaPotenciaFiscalizadaKw"])
+    novo.loc[alteradas, "MdaPotenciaFiscalizadaKw"] = np.round(potencias * rng.uniform(0.5, 1.5, quantidade), 2)
+    incluidas = gerar_dataframe_siga(quantidade, semente)
+    incluidas["CodCEG"] = incluidas["CodCEG"].str.replace(".XX.", ".NV.", regex=False)
+    return pd.concat([novo.drop(index=removidas), incluidas], ignore_index=True)
+
+
+def gravar_csv_siga(df, caminho):
+    """Grava o DataFrame de texto como CSV do SIGA (latin1, `;`) e retorna o caminho."""
+    df.to_csv(caminho, sep=";", index=False, encoding="latin1")
+    return caminho
+
+
+def gerar_csv_siga(caminho, linhas, semente=42):
+    """Grava um CSV sintético do SIGA em `caminho` e retorna o caminho."""
+    return gravar_csv_siga(gerar_dataframe_siga(linhas, semente), caminho)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("saida", help="caminho do CSV gerado")
+    parser.add_argument("--linhas", type=int, default=100_000)
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+    gerar_csv_siga(args.saida, args.linhas, args.semente)
+    print(f"{args.linhas} usinas gravadas em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Verificação da atualização incremental: o dataset em cache depois de um novo snapshot é o mesmo
+que a releitura do Parquet, e as estruturas posicionais (índice de filtros, cubo) continuam válidas.
+
+Para cada tamanho: ingere um CSV sintético, filtra, aplica um snapshot com parte das usinas alterada,
+filtra de novo, despeja o dataset do cache, relê e compara. Termina com código 1 se algo divergir.
+
+Uso (na raiz do projeto):
+    python -m benchmarks.verificar_atualizacao --linhas 5000 50000 --fracao 0.02
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+from benchmarks.gerador_siga import alterar_snapshot, gerar_dataframe_siga, gravar_csv_siga
+from agregados import CuboAgregado, cache_cubos, fatiar_cubo
+from atualizacao_incremental import ingerir_snapshot
+from data_loader import cache_dados, carregar_dados
+from file_manager import UPLOAD_DIR
+from filters import aplicar_filtros, cache_indices
+
+NOME_ARQUIVO = "siga-sintetico.csv"
+
+
+def filtros_parciais(df):
+    """Filtro com metade das UFs e das fontes: linhas fora dele denunciam máscaras aplicadas às linhas erradas."""
+    datas = df["DatInicioVigencia"].dropna()
+    ufs = sorted(df["SigUFPrincipal"].dropna().unique())
+    fontes = sorted(df["NomFonteCombustivel"].dropna().unique())
+    return (datas.min().year * 12 + 1, datas.max().year * 12 + 12,
+            df["DscOrigemCombustivel"].cat.categories.tolist(), fontes[::2], ufs[::2])
+
+
+def verificar(linhas, fracao, semente):
+    """Lista das divergências encontradas para um snapshot de `linhas` usinas."""
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    caminho = os.path.join(UPLOAD_DIR, NOME_ARQUIVO)
+    base = gerar_dataframe_siga(linhas, semente)
+    gravar_csv_siga(base, caminho)
+    ingerir_snapshot(caminho)
+    filtros = filtros_parciais(carregar_dados([NOME_ARQUIVO]))
+    aplicar_filtros(carregar_dados([NOME_ARQUIVO]), filtros)
+    fatiar_cubo(carregar_dados([NOME_ARQUIVO]), filtros)
+
+    gravar_csv_siga(alterar_snapshot(base, fracao, semente + 1), caminho)
+    if ingerir_snapshot(caminho) is None:
+        return ["o novo snapshot não foi aplicado de forma incremental"]
+    atualizado = carregar_dados([NOME_ARQUIVO])
+    filtrado = aplicar_filtros(atualizado, filtros)
+    celulas = fatiar_cubo(atualizado, filtros)
+
+    # Despejo do dataset: a releitura tem a mesma assinatura e reaproveita índice e cubo em cache
+    cache_dados.limpar()
+    relido = carregar_dados([NOME_ARQUIVO])
+    refiltrado = aplicar_filtros(relido, filtros)
+
+    divergencias = []
+    if not atualizado.reset_index(drop=True).equals(relido.reset_index(drop=True)):
+        divergencias.append("dataset em cache diferente da releitura do Parquet")
+    inicio, fim, origens, fontes, estados = filtros
+    fora = ~(refiltrado["SigUFPrincipal"].isin(estados) & refiltrado["NomFonteCombustivel"].isin(fontes)
+             & refiltrado["ChaveAnoMes"].between(inicio, fim))
+    if fora.any():
+        divergencias.append(f"{int(fora.sum())} de {len(refiltrado)} linhas filtradas fora do filtro após o despejo")
+    if not filtrado.reset_index(drop=True).equals(refiltrado.reset_index(drop=True)):
+        divergencias.append("filtro antes e depois do despejo com resultados diferentes")
+    referencia = CuboAgregado(relido).fatiar(*filtros)
+    if len(referencia) != len(celulas) or int(referencia["usinas"].sum()) != int(celulas["usinas"].sum()):
+        divergencias.append("cubo atualizado diferente do reconstruído a partir da releitura")
+
+    for cache in (cache_dados, cache_indices, cache_cubos):
+        cache.limpar()
+    return divergencias
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, nargs="+", default=[5_000, 50_000])
+    parser.add_argument("--fracao", type=float, default=0.02, help="fração das usinas alterada no novo snapshot")
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+
+    falhas = 0
+    diretorio_original = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="verificar_atualizacao_") as diretorio:
+        # uploaded_files/ e datasets/ são relativos ao diretório de trabalho
+        os.chdir(diretorio)
+        try:
+            for linhas in args.linhas:
+                divergencias = verificar(linhas, args.fracao, args.semente)
+                falhas += len(divergencias)
+                print(f"{linhas:>9} | {'ok' if not divergencias else '; '.join(divergencias)}", flush=True)
+        finally:
+            os.chdir(diretorio_original)
+    if falhas:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import sys
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+
+def tamanho_em_bytes(valor):
+    """Estima o espaço ocupado em memória por um valor armazenado no cache."""
+    if isinstance(valor, pd.DataFrame):
+        return int(valor.memory_usage(deep=True).sum())
+    if isinstance(valor, pd.Series):
+        return int(valor.memory_usage(deep=True))
+    if isinstance(valor, (bytes, bytearray)):
+        return len(valor)
+    if hasattr(valor, "nbytes"):
+        return int(valor.nbytes)
+    return sys.getsizeof(valor)
+
+
+def assinar(df, assinatura):
+    """Associa uma assinatura de conteúdo (chave hashable) a este objeto DataFrame específico."""
+    df.attrs["assinatura_dados"] = (assinatura, id(df))
+    return df
+
+
+def assinatura_de(df):
+    """Assinatura de conteúdo do DataFrame, ou None se ele foi derivado de outro (cópia, filtro, ordenação).
+
+    O pandas propaga `attrs` para os objetos derivados; guardar o id do objeto assinado
+    impede que uma cópia ordenada ou filtrada seja confundida com o original.
+    """
+    valor = df.attrs.get("assinatura_dados")
+    if valor is None or valor[1] != id(df):
+        return None
+    return valor[0]
+
+
+class CacheLRU:
+    """Cache em memória, compartilhado entre sessões, com orçamento de bytes e despejo LRU."""
+
+    def __init__(self, orcamento_bytes, medir=tamanho_em_bytes):
+        self.orcamento_bytes = orcamento_bytes
+        self._medir = medir
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes_usados = 0
+        self.acertos = 0
+        self.falhas = 0
+        self.despejos = 0
+
+    def obter(self, chave, padrao=None):
+        """Retorna o valor da chave (marcando-o como recente) ou `padrao` se ausente."""
+        with self._lock:
+            if chave not in self._itens:
+                self.falhas += 1
+                return padrao
+            self._itens.move_to_end(chave)
+            self.acertos += 1
+            return self._itens[chave][0]
+
+    def guardar(self, chave, valor):
+        """Armazena o valor e despeja os itens menos recentes até caber no orçamento."""
+        tamanho = self._medir(valor)
+        with self._lock:
+            if chave in self._itens:
+                self.bytes_usados -= self._itens.pop(chave)[1]
+            # Itens maiores que o orçamento inteiro não são guardados
+            if tamanho > self.orcamento_bytes:
+                return valor
+            self._itens[chave] = (valor, tamanho)
+            self.bytes_usados += tamanho
+            while self.bytes_usados > self.orcamento_bytes:
+                _, (_, tamanho_antigo) = self._itens.popitem(last=False)
+                self.bytes_usados -= tamanho_antigo
+                self.despejos += 1
+        return valor
+
+    def invalidar(self, condicao):
+        """Remove todas as entradas cuja chave satisfaz `condicao(chave)`."""
+        with self._lock:
+            for chave in [c for c in self._itens if condicao(c)]:
+                self.bytes_usados -= self._itens.pop(chave)[1]
+
+    def limpar(self):
+        """Esvazia o cache e zera os contadores."""
+        with self._lock:
+            self._itens.clear()
+            self.bytes_usados = 0
+            self.acertos = self.falhas = self.despejos = 0
+
+    def __len__(self):
+        return len(self._itens)
+
+    def estatisticas(self):
+        """Retorna contadores de acertos, falhas, despejos e uso de memória."""
+        with self._lock:
+            return {
+                "entradas": len(self._itens),
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "despejos": self.despejos,
+                "bytes_usados": self.bytes_usados,
+                "orcamento_bytes": self.orcamento_bytes,
+            }
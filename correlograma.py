@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+from pesos_espaciais import METODOS_VIZINHANCA, KM_POR_GRAU, RAIO_TERRA_KM, projetar
+
+# 📈 Correlograma de Moran: I global para várias bandas de distância com uma única busca de pares
+
+
+def distancias_pares_km(coords, pares, metodo="graus"):
+    """Distância (km) de cada par, na mesma métrica usada pela busca de vizinhos do `metodo`."""
+    i, j = pares[:, 0], pares[:, 1]
+    if metodo == "geodesica":
+        lon, lat = np.radians(coords[:, 0]), np.radians(coords[:, 1])
+        a = (np.sin((lat[j] - lat[i]) / 2) ** 2
+             + np.cos(lat[i]) * np.cos(lat[j]) * np.sin((lon[j] - lon[i]) / 2) ** 2)
+        return 2 * RAIO_TERRA_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+    if metodo == "projetada":
+        xy = projetar(coords)
+        return np.hypot(*(xy[i] - xy[j]).T) / 1000
+    return np.hypot(*(coords[i] - coords[j]).T) * KM_POR_GRAU
+
+
+def unidades_por_pares(coords, distancia_km, pares_maximos, metodo="graus", amostra_estimativa=1000, semente=0):
+    """Quantas unidades (no máximo todas) cabem numa busca de pares até `distancia_km` com ~`pares_maximos` pares.
+
+    O número de pares é estimado numa subamostra de `amostra_estimativa` unidades; como cresce com o
+    quadrado de n, uma amostra aleatória de n·√(limite/estimativa) unidades fica perto do limite.
+    """
+    n = len(coords)
+    m = min(n, amostra_estimativa)
+    if m < 2:
+        return n
+    subamostra = coords if m == n else coords[np.random.default_rng(semente).choice(n, m, replace=False)]
+    estimativa = len(METODOS_VIZINHANCA[metodo](subamostra, distancia_km)) * (n * (n - 1)) / (m * (m - 1))
+    if estimativa <= pares_maximos:
+        return n
+    return max(2, int(n * np.sqrt(pares_maximos / estimativa)))
+
+
+def correlograma_moran(coords, y, distancias_km, metodo="graus"):
+    """Moran's I global (pesos binários por banda, padronizados por linha) para cada distância de `distancias_km`.
+
+    Os pares até a maior distância são buscados e ordenados uma única vez; cada limiar seguinte só
+    acrescenta, à soma dos vizinhos e à contagem de cada unidade, os pares da nova faixa.
+    Retorna um DataFrame com DistanciaKm, I, VizinhosMedios e Isoladas (unidades sem vizinhos).
+    """
+    coords = np.asarray(coords, dtype="float64")
+    distancias_km = np.sort(np.asarray(distancias_km, dtype="float64"))
+    pares = METODOS_VIZINHANCA[metodo](coords, distancias_km[-1])
+    distancias = distancias_pares_km(coords, pares, metodo)
+    ordem = np.argsort(distancias, kind="stable")
+    pares, distancias = pares[ordem], distancias[ordem]
+    limites = np.searchsorted(distancias, distancias_km, side="right")
+
+    y = np.asarray(y, dtype="float64")
+    n = len(y)
+    z = y - y.mean()
+    soma_quadrados = z @ z
+    soma_vizinhos = np.zeros(n)
+    vizinhos = np.zeros(n, dtype=np.int64)
+
+    linhas = []
+    inicio = 0
+    for distancia, fim in zip(distancias_km, limites):
+        i, j = pares[inicio:fim, 0], pares[inicio:fim, 1]
+        soma_vizinhos += np.bincount(i, weights=z[j], minlength=n) + np.bincount(j, weights=z[i], minlength=n)
+        vizinhos += np.bincount(i, minlength=n) + np.bincount(j, minlength=n)
+        inicio = fim
+
+        com_vizinhos = vizinhos > 0
+        s0 = int(com_vizinhos.sum())  # soma dos pesos padronizados por linha
+        I = np.nan
+        if s0 and soma_quadrados:
+            I = n / s0 * (z[com_vizinhos] * soma_vizinhos[com_vizinhos] / vizinhos[com_vizinhos]).sum() / soma_quadrados
+        linhas.append((distancia, I, vizinhos.mean(), n - s0))
+
+    return pd.DataFrame(linhas, columns=["DistanciaKm", "I", "VizinhosMedios", "Isoladas"])
@@ -1,6 +1,45 @@
 import pandas as pd
+import numpy as np
 import os
 import csv
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.compute as pc
+import armazenamento
+from cache_lru import CacheLRU, assinar, assinatura_de
+from file_manager import UPLOAD_DIR
+
+# 🗄️ Cache compartilhado entre reruns e sessões (orçamento em MB configurável)
+CACHE_DADOS_MB = int(os.environ.get("CACHE_DADOS_MB", "1024"))
+cache_dados = CacheLRU(CACHE_DADOS_MB * 1024 * 1024)
+
+# 📐 Esquema declarado: apenas as colunas usadas pelo painel e pelos filtros
+COLUNAS_TEXTO = ["CodCEG", "NomEmpreendimento", "DscTipoOutorga", "DscPropriRegimePariticipacao"]
+COLUNAS_CATEGORICAS = ["DscOrigemCombustivel", "NomFonteCombustivel", "SigUFPrincipal", "DscFaseUsina"]
+COLUNAS_COORDENADAS = ["NumCoordNEmpreendimento", "NumCoordEEmpreendimento"]
+COLUNAS_SIGA = COLUNAS_TEXTO + COLUNAS_CATEGORICAS + COLUNAS_COORDENADAS + [
+    "DatInicioVigencia", "DatFimVigencia", "MdaPotenciaFiscalizadaKw"
+]
+CATEGORIAS_GERACAO = ["Microgeração", "Minigeração", "Geração"]
+
+# ⚡ Limites (kW) da classificação Micro/Mini/Geração, configuráveis por variável de ambiente
+LIMITE_MICROGERACAO_KW = float(os.environ.get("LIMITE_MICROGERACAO_KW", "75"))
+LIMITE_MINIGERACAO_KW = float(os.environ.get("LIMITE_MINIGERACAO_KW", "5000"))
+CHAVE_ANO_MES_AUSENTE = -1
+
+# ⚙️ Motor de leitura do CSV: "pyarrow" (multithread, em blocos, com filtro por bloco) ou "pandas"
+MOTOR_CSV = os.environ.get("MOTOR_CSV", "pyarrow")
+TAMANHO_BLOCO_CSV = 4 * 1024 * 1024
+
+# 🧵 Arquivos carregados em paralelo (threads: Arrow e o parser do pandas liberam o GIL)
+TRABALHADORES_CARGA = int(os.environ.get("TRABALHADORES_CARGA", os.cpu_count() or 1))
+
+_hashes_arquivos = {}
+_chave_por_caminho = {}
+_lock_chaves = threading.Lock()
 
 def detectar_delimitador(file_path):
     """Detecta automaticamente o delimitador do arquivo CSV."""
@@ -9,32 +48,223 @@ def detectar_delimitador(file_path):
         first_line = f.readline()
         return ";" if ";" in first_line else ","
 
-def carregar_dados(file_paths):
-    """Carrega e processa os arquivos CSV selecionados, filtrando apenas usinas em Operação."""
+def hash_arquivo(file_path):
+    """Calcula o hash SHA-1 do conteúdo do arquivo, reaproveitando-o enquanto mtime e tamanho não mudarem."""
+    info = os.stat(file_path)
+    assinatura = (file_path, info.st_mtime_ns, info.st_size)
+    if assinatura not in _hashes_arquivos:
+        sha1 = hashlib.sha1()
+        with open(file_path, "rb") as f:
+            for bloco in iter(lambda: f.read(1024 * 1024), b""):
+                sha1.update(bloco)
+        _hashes_arquivos[assinatura] = sha1.hexdigest()
+    return _hashes_arquivos[assinatura], info.st_mtime_ns
+
+def converter_decimal(serie, dtype="float64"):
+    """Converte números com vírgula decimal (padrão ANEEL) para float."""
+    return pd.to_numeric(serie.astype(str).str.replace(",", ".", regex=False), errors="coerce").astype(dtype)
+
+def aplicar_esquema(df):
+    """Garante os tipos categóricos do esquema (necessário após ler colunas de partição)."""
+    tipos = {col: "category" for col in COLUNAS_CATEGORICAS if col in df.columns and df[col].dtype != "category"}
+    return df.astype(tipos) if tipos else df
+
+def ler_cabecalho(file_path, delimitador):
+    """Retorna os nomes das colunas da primeira linha do CSV."""
+    with open(file_path, 'r', encoding="latin1", newline="") as f:
+        return next(csv.reader(f, delimiter=delimitador))
+
+def ler_csv_pandas(file_path, delimitador):
+    """Lê o CSV inteiro com o parser C do pandas e depois filtra as usinas em "Operação"."""
+    df = pd.read_csv(file_path, delimiter=delimitador, encoding="latin1",
+                     usecols=lambda col: col in COLUNAS_SIGA,
+                     dtype={**{col: "category" for col in COLUNAS_CATEGORICAS},
+                            **{col: str for col in COLUNAS_TEXTO + COLUNAS_COORDENADAS}})
+    return df[df["DscFaseUsina"] == "Operação"].reset_index(drop=True)
+
+def ler_csv_arrow(file_path, delimitador):
+    """Lê o CSV em blocos com o leitor multithread do Arrow, descartando as usinas fora de "Operação" a cada bloco."""
+    colunas = [col for col in ler_cabecalho(file_path, delimitador) if col in COLUNAS_SIGA]
+    tipos = {col: pa.string() for col in colunas}
+    tipos.update({col: pa.dictionary(pa.int32(), pa.string()) for col in COLUNAS_CATEGORICAS
+                  if col in colunas and col != "DscFaseUsina"})
+
+    leitor = pa_csv.open_csv(
+        file_path,
+        read_options=pa_csv.ReadOptions(encoding="latin1", block_size=TAMANHO_BLOCO_CSV, use_threads=True),
+        parse_options=pa_csv.ParseOptions(delimiter=delimitador, newlines_in_values=True),  # nomes com quebra de linha
+        convert_options=pa_csv.ConvertOptions(include_columns=colunas, column_types=tipos, strings_can_be_null=True)
+    )
+
+    # Pico de memória limitado às linhas que sobrevivem ao filtro (mais um bloco em leitura)
+    blocos = [bloco.filter(pc.equal(bloco.column("DscFaseUsina"), "Operação")) for bloco in leitor]
+    return pa.Table.from_batches(blocos, schema=leitor.schema).to_pandas()
+
+LEITORES_CSV = {"pandas": ler_csv_pandas, "pyarrow": ler_csv_arrow}
+
+def processar_arquivo(file_path, motor=None):
+    """Lê um CSV do SIGA com o esquema declarado e aplica o filtro de "Operação" e as conversões de tipo."""
+    delimitador = detectar_delimitador(file_path)
+    try:
+        df = LEITORES_CSV[motor or MOTOR_CSV](file_path, delimitador)
+    except pa.ArrowInvalid:
+        # Linhas malformadas (ex.: um campo a mais) que o Arrow rejeita: o parser do pandas as aceita
+        df = ler_csv_pandas(file_path, delimitador)
+    df = aplicar_esquema(df)
+    df["DscFaseUsina"] = df["DscFaseUsina"].cat.remove_unused_categories()
+
+    # Conversão de tipos (coordenadas com vírgula decimal convertidas uma única vez, em float32)
+    df["DatInicioVigencia"] = pd.to_datetime(df["DatInicioVigencia"], errors="coerce")
+    df["DatFimVigencia"] = pd.to_datetime(df["DatFimVigencia"], errors="coerce")
+    df["MdaPotenciaFiscalizadaKw"] = pd.to_numeric(df["MdaPotenciaFiscalizadaKw"], errors='coerce')
+    for col in COLUNAS_COORDENADAS:
+        df[col] = converter_decimal(df[col], "float32")
+
+    return aplicar_esquema(df)
+
+def classificar_geracao(potencia_kw, limite_micro_kw=None, limite_mini_kw=None):
+    """Classifica as usinas em Micro/Mini/Geração pela potência, de forma vetorizada (NaN cai em "Geração")."""
+    limite_micro_kw = LIMITE_MICROGERACAO_KW if limite_micro_kw is None else limite_micro_kw
+    limite_mini_kw = LIMITE_MINIGERACAO_KW if limite_mini_kw is None else limite_mini_kw
+    potencia = potencia_kw.to_numpy(dtype="float64", na_value=np.nan)
+    codigos = np.select([potencia <= limite_micro_kw, potencia <= limite_mini_kw], [0, 1], default=2)
+    return pd.Categorical.from_codes(codigos, dtype=pd.CategoricalDtype(CATEGORIAS_GERACAO, ordered=True))
+
+def adicionar_colunas_derivadas(df):
+    """Etapa única de colunas derivadas: classe de geração, chave ano-mês e máscara de coordenadas válidas."""
+    if "MdaPotenciaFiscalizadaKw" in df.columns:
+        df["TipoGeracaoDistribuida"] = classificar_geracao(df["MdaPotenciaFiscalizadaKw"])
+
+    # Chave inteira ano * 12 + mês (mesma usada nos filtros); datas ausentes recebem CHAVE_ANO_MES_AUSENTE
+    if "DatInicioVigencia" in df.columns:
+        datas = df["DatInicioVigencia"]
+        chave = datas.dt.year * 12 + datas.dt.month
+        df["ChaveAnoMes"] = chave.fillna(CHAVE_ANO_MES_AUSENTE).astype("int32")
+
+    if all(col in df.columns for col in COLUNAS_COORDENADAS):
+        lat = df["NumCoordNEmpreendimento"].to_numpy()
+        lon = df["NumCoordEEmpreendimento"].to_numpy()
+        df["CoordenadaValida"] = (np.isfinite(lat) & np.isfinite(lon)
+                                  & (np.abs(lat) <= 90) & (np.abs(lon) <= 180))
+    return df
+
+def carregar_arquivo(file_path):
+    """Retorna o DataFrame processado de um arquivo, usando o cache por hash de conteúdo + mtime."""
+    conteudo_hash, mtime = hash_arquivo(file_path)
+    chave = (file_path, conteudo_hash, mtime)
+
+    # Arquivo alterado em uploaded_files/: descartar a versão antiga do cache
+    with _lock_chaves:
+        chave_anterior = _chave_por_caminho.get(file_path)
+        _chave_por_caminho[file_path] = chave
+    if chave_anterior is not None and chave_anterior != chave:
+        cache_dados.invalidar(lambda c: c == chave_anterior)
+
+    df = cache_dados.obter(chave)
+    if df is None:
+        df = adicionar_colunas_derivadas(processar_arquivo(file_path))
+        assinar(df, chave)
+        df = cache_dados.guardar(chave, df)
+    return df
+
+def ingerir_arquivo(file_path, nome=None):
+    """Converte um CSV do SIGA em dataset Parquet particionado, uma única vez por conteúdo."""
+    nome = nome or os.path.basename(file_path)
+    conteudo_hash, _ = hash_arquivo(file_path)
+    linhas = None
+
+    # Conteúdo idêntico já ingerido (mesmo hash): apenas registra o nome
+    df = None if armazenamento.dataset_existe(conteudo_hash) else processar_arquivo(file_path)
+    with armazenamento.lock_repositorio:
+        if not armazenamento.dataset_existe(conteudo_hash):
+            df = processar_arquivo(file_path) if df is None else df
+            armazenamento.escrever_dataset(df, conteudo_hash)
+            linhas = len(df)
+        armazenamento.registrar_dataset(nome, conteudo_hash, file_path, linhas)
+    return conteudo_hash
+
+def chave_dataset(conteudo_hash, colunas=None, ufs=None, anos=None):
+    """Chave do cache (e assinatura) de uma leitura de dataset Parquet."""
+    return (
+        "parquet", armazenamento.VERSAO_ESQUEMA, conteudo_hash,
+        tuple(colunas) if colunas is not None else None,
+        tuple(sorted(ufs)) if ufs is not None else None,
+        tuple(sorted(anos)) if anos is not None else None,
+    )
+
+def carregar_dataset(conteudo_hash, colunas=None, ufs=None, anos=None):
+    """Lê um dataset Parquet (colunas e partições solicitadas), usando o cache compartilhado."""
+    chave = chave_dataset(conteudo_hash, colunas, ufs, anos)
+    df = cache_dados.obter(chave)
+    if df is None:
+        df = adicionar_colunas_derivadas(aplicar_esquema(armazenamento.ler_dataset(conteudo_hash, colunas, ufs, anos)))
+        assinar(df, chave)
+        df = cache_dados.guardar(chave, df)
+    return df
+
+def carregar_item(file_path, colunas=None, ufs=None, anos=None):
+    """Carrega um único dataset (ou CSV ainda não ingerido) com as colunas e partições pedidas."""
+    registro = armazenamento.obter_dataset(file_path)
+    if registro is not None and armazenamento.dataset_existe(registro["hash"]):
+        return carregar_dataset(registro["hash"], colunas, ufs, anos)
+
+    # CSV ainda não ingerido: processa diretamente e aplica a mesma seleção
+    df = carregar_arquivo(os.path.join(UPLOAD_DIR, file_path))
+    if colunas is None and ufs is None and anos is None:
+        return df
+    assinatura = (assinatura_de(df),) + chave_dataset(None, colunas, ufs, anos)[3:]
+    if ufs is not None:
+        df = df[df["SigUFPrincipal"].isin(list(ufs))]
+    if anos is not None:
+        df = df[df["DatInicioVigencia"].dt.year.isin(list(anos))]
+    if colunas is not None:
+        df = df[[col for col in colunas if col in df.columns]]
+    return assinar(df, assinatura)
+
+def carregar_dados(file_paths, colunas=None, ufs=None, anos=None, erros=None):
+    """Carrega os datasets selecionados em paralelo (apenas usinas em Operação), lendo só as colunas e partições pedidas.
+
+    Se `erros` for um dicionário, a falha de um arquivo é registrada nele (arquivo → mensagem)
+    e os demais continuam sendo carregados; caso contrário, a primeira falha é propagada.
+    O DataFrame retornado é compartilhado pelo cache e não deve ser modificado.
+    """
+    trabalhadores = max(1, min(TRABALHADORES_CARGA, len(file_paths)))
+    with ThreadPoolExecutor(max_workers=trabalhadores) as executor:
+        futuros = [executor.submit(carregar_item, file_path, colunas, ufs, anos) for file_path in file_paths]
+
+    # Junta na ordem da seleção, independentemente da ordem de conclusão
     df_list = []
-    for file_path in file_paths:
-        delimitador = detectar_delimitador(os.path.join("uploaded_files", file_path))
-        df = pd.read_csv(os.path.join("uploaded_files", file_path), delimiter=delimitador, encoding="latin1",
-                         low_memory=False)
-
-        # Filtrar apenas usinas em "Operação"
-        df = df[df["DscFaseUsina"] == "Operação"]
-
-        # Conversão de tipos
-        df["DatInicioVigencia"] = pd.to_datetime(df["DatInicioVigencia"], errors="coerce")
-        df["DatFimVigencia"] = pd.to_datetime(df["DatFimVigencia"], errors="coerce")
-        df["MdaPotenciaFiscalizadaKw"] = pd.to_numeric(df["MdaPotenciaFiscalizadaKw"], errors='coerce')
-
-        # Classificação das usinas
-        def classificar_geracao(potencia_kw):
-            if potencia_kw <= 75:
-                return "Microgeração"
-            elif 75 < potencia_kw <= 5000:
-                return "Minigeração"
-            else:
-                return "Geração"
-
-        df["TipoGeracaoDistribuida"] = df["MdaPotenciaFiscalizadaKw"].apply(classificar_geracao)
-        df_list.append(df)
-
-    return pd.concat(df_list, ignore_index=True)
\ No newline at end of file
+    for file_path, futuro in zip(file_paths, futuros):
+        try:
+            df_list.append(futuro.result())
+        except Exception as e:
+            if erros is None:
+                raise
+            erros[file_path] = str(e)
+
+    if not df_list:
+        return pd.DataFrame()
+    if len(df_list) == 1:
+        return df_list[0]
+
+    # Seleções com vários datasets: a concatenação também fica no cache, para que a mesma
+    # seleção devolva sempre o mesmo objeto (e os índices construídos sobre ele sejam reaproveitados)
+    chave = ("selecao",) + tuple(assinatura_de(df) for df in df_list)
+    df = cache_dados.obter(chave)
+    if df is None:
+        df = concatenar_dados(df_list)
+        assinar(df, chave)
+        df = cache_dados.guardar(chave, df)
+    return df
+
+def concatenar_dados(df_list):
+    """Concatena DataFrames preservando as colunas categóricas (união das categorias de cada arquivo)."""
+    for col in df_list[0].columns:
+        if df_list[0][col].dtype == "category" and len(df_list) > 1:
+            categorias = list(dict.fromkeys(c for df in df_list for c in df[col].cat.categories))
+            df_list = [df.assign(**{col: df[col].cat.set_categories(categorias)}) for df in df_list]
+    return pd.concat(df_list, ignore_index=True)
+
+def estatisticas_cache():
+    """Retorna os contadores de acerto/falha e o uso de memória do cache de dados."""
+    return cache_dados.estatisticas()
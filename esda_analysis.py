@@ -1,19 +1,224 @@
+import os
+import hashlib
 import geopandas as gpd
-from shapely.geometry import Point
-from esda.moran import Moran, Moran_Local
-from libpysal.weights import DistanceBand
+from pesos_espaciais import obter_pesos
+from grade_hexagonal import agregar_hexagonos, pesos_contiguidade, ROTULOS_AGREGACOES
+from correlograma import correlograma_moran, unidades_por_pares
+from inferencia_esda import inferencia_moran, SEMENTE_PADRAO, NIVEL_SIGNIFICANCIA
+from cache_lru import CacheLRU, assinatura_de
+from instrumentacao import instrumentar, medir
 import streamlit as st
 import numpy as np
+import pandas as pd
+import altair as alt
 import matplotlib.pyplot as plt
 from streamlit_folium import folium_static
 import folium
 from folium.plugins import MiniMap, MeasureControl
 
 
+# =============================
+# 📍 Geometrias em lote
+# =============================
+def criar_geodataframe(df):
+    """Cria o GeoDataFrame (EPSG:4326) das usinas com coordenadas válidas, com os pontos construídos em lote."""
+    df = df[df["CoordenadaValida"]]
+    geometria = gpd.points_from_xy(df["NumCoordEEmpreendimento"], df["NumCoordNEmpreendimento"])
+    return gpd.GeoDataFrame(df, geometry=geometria, crs="EPSG:4326")
+
+
+def coordenadas(gdf):
+    """Matriz (n, 2) de longitude/latitude extraída das geometrias, sem laço em Python."""
+    return np.column_stack([gdf.geometry.x.to_numpy(), gdf.geometry.y.to_numpy()])
+
+
+# =============================
+# 🧠 Resultado ESDA memorizado
+# =============================
+PERMUTACOES_PADRAO = 999
+
+# Unidades de análise: usinas (pontos, banda de distância) ou hexágonos (agregados, contiguidade)
+ROTULOS_UNIDADES = {"usina": "Usinas (pontos)", "hexagono": "Hexágonos (agregado)"}
+LIMITE_USINAS_PONTUAL = int(os.environ.get("LIMITE_USINAS_ESDA_PONTUAL", "50000"))  # acima disso, sugere hexágonos
+AMOSTRA_MAXIMA_CORRELOGRAMA = int(os.environ.get("AMOSTRA_MAXIMA_CORRELOGRAMA", "10000"))
+# Pares até a maior distância do correlograma (~56 bytes cada entre busca, distâncias e ordenação)
+PARES_MAXIMOS_CORRELOGRAMA = int(os.environ.get("PARES_MAXIMOS_CORRELOGRAMA", "2000000"))
+
+# Um resultado por (dados, filtros, coluna, unidade, vizinhança, permutações), compartilhado entre reruns e sessões
+cache_esda = CacheLRU(int(os.environ.get("CACHE_ESDA_MB", "256")) * 1024 * 1024)
+
+
+# 🎨 Cores dos clusters LISA (mapa interativo e figuras estáticas dos relatórios)
+CORES_CLUSTERS = {
+    "Alta-Alta 🔥": "red",
+    "Baixa-Baixa ❄️": "blue",
+    "Baixa-Alta": "orange",
+    "Alta-Baixa": "green",
+    "Não Significativo": "gray"
+}
+
+
+def rotular_clusters(p_sim, q, nivel=NIVEL_SIGNIFICANCIA):
+    """Rótulo do cluster LISA de cada unidade a partir do p-valor simulado e do quadrante."""
+    rotulos = np.full(len(q), "Não Significativo", dtype=object)
+    sig = p_sim < nivel
+    rotulos[sig & (q == 1)] = "Alta-Alta 🔥"
+    rotulos[sig & (q == 3)] = "Baixa-Baixa ❄️"
+    rotulos[sig & (q == 2)] = "Baixa-Alta"
+    rotulos[sig & (q == 4)] = "Alta-Baixa"
+    return rotulos
+
+
+class ResultadoESDA:
+    """Moran global e LISA de um recorte dos dados, calculados uma vez e usados pelo gráfico, pelo mapa e pela exportação.
+
+    - `I`, `p_sim`: Moran's I global e p-valor simulado.
+    - `Is`, `p_sim_local`, `q`: estatística local, p-valor simulado e quadrante de cada unidade.
+    - `gdf`: unidades analisadas com a coluna `Cluster` — usinas com coordenadas válidas (pontos) ou
+      hexágonos (polígonos, com a potência agregada e o número de `Usinas`).
+    """
+
+    def __init__(self, gdf, coluna_valor, w, permutacoes=PERMUTACOES_PADRAO, semente=SEMENTE_PADRAO, unidade="usina",
+                 ao_progredir=None):
+        y = gdf[coluna_valor].fillna(0).to_numpy(dtype="float64")
+        inferencia = inferencia_moran(y, w, permutacoes=permutacoes, semente=semente, ao_progredir=ao_progredir)
+
+        self.coluna_valor = coluna_valor
+        self.permutacoes = permutacoes
+        self.unidade = unidade
+        self.I = inferencia.I
+        self.p_sim = inferencia.p_sim
+        self.Is = inferencia.Is
+        self.p_sim_local = inferencia.p_sim_local
+        self.q = inferencia.q
+        self.ligacoes = int(w.sparse.nnz)  # pares de vizinhos na matriz de pesos
+        colunas = [c for c in ["NomEmpreendimento", "SigUFPrincipal", coluna_valor, "Usinas"] if c in gdf.columns]
+        self.gdf = gdf[colunas + ["geometry"]].assign(Cluster=rotular_clusters(self.p_sim_local, self.q))
+
+    @property
+    def nbytes(self):
+        return int(self.gdf.memory_usage(deep=True).sum()) + self.Is.nbytes + self.p_sim_local.nbytes + self.q.nbytes
+
+    def tabela(self):
+        """DataFrame plano (sem geometria) com as estatísticas locais de cada unidade, para exportação."""
+        pontos = self.gdf.geometry.representative_point()  # a própria usina ou um ponto interno do hexágono
+        tabela = self.gdf.drop(columns="geometry").assign(
+            Longitude=pontos.x, Latitude=pontos.y,
+            IndiceLocal=self.Is, PValorSimulado=self.p_sim_local, Quadrante=self.q,
+        )
+        return tabela
+
+
+def avisar_sem_vizinhos(resultado):
+    """Avisa quando nenhuma unidade tem vizinhos na matriz de pesos; retorna True nesse caso."""
+    if resultado.ligacoes > 0:
+        return False
+    if resultado.unidade == "hexagono":
+        st.warning("⚠️ Nenhum hexágono tem vizinhos: amplie o recorte ou reduza o tamanho dos hexágonos.")
+    else:
+        st.warning("⚠️ Nenhuma usina tem vizinhos na distância escolhida: aumente a distância da vizinhança.")
+    return True
+
+
+def chave_conteudo(gdf, coluna_valor):
+    """Hash das coordenadas e dos valores, usado quando o DataFrame não tem assinatura de origem."""
+    resumo = hashlib.sha1(np.ascontiguousarray(coordenadas(gdf), dtype="float64").tobytes())
+    resumo.update(gdf[coluna_valor].fillna(0).to_numpy(dtype="float64").tobytes())
+    return resumo.hexdigest()
+
+
+def memorizar_esda(df, coluna_valor, parametros, calcular):
+    """Retorna `calcular(gdf)` para o recorte `df` e os `parametros`, calculando apenas na primeira vez.
+
+    Com assinatura (dataset + filtros) o acerto no cache dispensa até a montagem do GeoDataFrame;
+    sem ela, a chave é o hash das coordenadas e dos valores. Retorna None se não há coordenadas válidas.
+    """
+    assinatura = assinatura_de(df)
+    if assinatura is not None:
+        chave = ("assinatura", assinatura) + parametros
+        valor = cache_esda.obter(chave)
+        if valor is not None:
+            return valor
+
+    gdf = criar_geodataframe(df)
+    if gdf.empty:
+        return None
+    if assinatura is None:
+        chave = ("conteudo", chave_conteudo(gdf, coluna_valor)) + parametros
+        valor = cache_esda.obter(chave)
+        if valor is not None:
+            return valor
+    return cache_esda.guardar(chave, calcular(gdf))
+
+
+@instrumentar()
+def obter_resultado_esda(df, coluna_valor="MdaPotenciaFiscalizadaKw", distancia_km=300, metodo_vizinhanca="graus",
+                         permutacoes=PERMUTACOES_PADRAO, semente=SEMENTE_PADRAO, unidade="usina",
+                         tamanho_hex_km=50, agregacao="soma", ao_progredir=None):
+    """Retorna o ResultadoESDA do recorte, calculando Moran e LISA apenas na primeira vez para a mesma chave.
+
+    Com `unidade="hexagono"` as usinas são agregadas em hexágonos de raio `tamanho_hex_km` (soma ou média da
+    potência) e a vizinhança é a contiguidade entre hexágonos; `distancia_km` e `metodo_vizinhanca` não se aplicam.
+    `ao_progredir(feitas, total, mensagem)` acompanha o cálculo (usado pelas tarefas em segundo plano).
+    """
+    def calcular(gdf):
+        if ao_progredir is not None:
+            ao_progredir(0, permutacoes, "Construindo a vizinhança")
+        if unidade == "hexagono":
+            gdf = agregar_hexagonos(gdf, coluna_valor, tamanho_hex_km, agregacao)
+            w = pesos_contiguidade(gdf)
+        else:
+            w = obter_pesos(coordenadas(gdf), distancia_km, metodo_vizinhanca)
+        return ResultadoESDA(gdf, coluna_valor, w, permutacoes, semente, unidade, ao_progredir)
+
+    if unidade == "hexagono":
+        parametros = (coluna_valor, unidade, tamanho_hex_km, agregacao, permutacoes, semente)
+    else:
+        parametros = (coluna_valor, unidade, distancia_km, metodo_vizinhanca, permutacoes, semente)
+    return memorizar_esda(df, coluna_valor, parametros, calcular)
+
+
+def obter_correlograma(df, distancias_km, coluna_valor="MdaPotenciaFiscalizadaKw", metodo_vizinhanca="graus",
+                       unidade="usina", tamanho_hex_km=50, agregacao="soma", amostra_maxima=None):
+    """Correlograma de Moran (I por distância) do recorte, memorizado como os demais resultados ESDA.
+
+    Em hexágonos, as distâncias são geodésicas entre pontos internos das células. Com mais usinas que
+    `amostra_maxima`, ou mais pares até a maior distância que PARES_MAXIMOS_CORRELOGRAMA, usa uma amostra
+    aleatória fixa (o número de pares cresce com o quadrado de n).
+    Retorna (correlograma, unidades usadas, unidades totais), ou None sem coordenadas válidas.
+    """
+    amostra_maxima = amostra_maxima or AMOSTRA_MAXIMA_CORRELOGRAMA
+    distancias_km = tuple(sorted(distancias_km))
+
+    def calcular(gdf):
+        if unidade == "hexagono":
+            gdf = agregar_hexagonos(gdf, coluna_valor, tamanho_hex_km, agregacao)
+            pontos = gdf.geometry.representative_point()
+            coords, metodo = np.column_stack([pontos.x.to_numpy(), pontos.y.to_numpy()]), "geodesica"
+        else:
+            coords, metodo = coordenadas(gdf), metodo_vizinhanca
+        y = gdf[coluna_valor].fillna(0).to_numpy(dtype="float64")
+        total = len(y)
+        tamanho = min(amostra_maxima, unidades_por_pares(coords, distancias_km[-1], PARES_MAXIMOS_CORRELOGRAMA,
+                                                         metodo, semente=SEMENTE_PADRAO))
+        if total > tamanho:
+            amostra = np.sort(np.random.default_rng(SEMENTE_PADRAO).choice(total, tamanho, replace=False))
+            coords, y = coords[amostra], y[amostra]
+        return correlograma_moran(coords, y, distancias_km, metodo), len(y), total
+
+    if unidade == "hexagono":
+        parametros = ("correlograma", coluna_valor, unidade, tamanho_hex_km, agregacao, distancias_km, amostra_maxima)
+    else:
+        parametros = ("correlograma", coluna_valor, unidade, metodo_vizinhanca, distancias_km, amostra_maxima)
+    return memorizar_esda(df, coluna_valor, parametros, calcular)
+
+
 # =============================
 # 🌐 Função: Moran Global
 # =============================
-def calcular_moran_global(df, coluna_valor="MdaPotenciaFiscalizadaKw", distancia_km=300):
+@instrumentar()
+def calcular_moran_global(df, coluna_valor="MdaPotenciaFiscalizadaKw", distancia_km=300, metodo_vizinhanca="graus",
+                          unidade="usina", tamanho_hex_km=50, agregacao="soma", resultado=None):
     """Calcula o Moran's I Global com base nas coordenadas das usinas."""
 
     st.subheader("🧭 Análise Espacial - Moran's I Global")
@@ -22,51 +227,31 @@ def calcular_moran_global(df, coluna_valor="MdaPotenciaFiscalizadaKw", distancia
         st.warning("⚠️ Dados geoespaciais ausentes. Não é possível calcular o índice de Moran.")
         return
 
-    # 🧹 Corrigir coordenadas
+    # 📈 Moran Global (resultado ESDA memorizado: geometria, vizinhança e estatísticas)
     try:
-        df["NumCoordNEmpreendimento"] = df["NumCoordNEmpreendimento"].astype(str).str.replace(",", ".").astype(float)
-        df["NumCoordEEmpreendimento"] = df["NumCoordEEmpreendimento"].astype(str).str.replace(",", ".").astype(float)
+        if resultado is None:
+            resultado = obter_resultado_esda(df, coluna_valor, distancia_km, metodo_vizinhanca,
+                                             unidade=unidade, tamanho_hex_km=tamanho_hex_km, agregacao=agregacao)
     except Exception as e:
-        st.error(f"Erro ao converter coordenadas: {e}")
+        st.error(f"Erro ao calcular Moran's I: {e}")
         return
 
-    # 🔍 Remover inválidos
-    df = df.dropna(subset=["NumCoordEEmpreendimento", "NumCoordNEmpreendimento"])
-    if df.empty:
+    if resultado is None:
         st.warning("⚠️ Não há dados válidos de coordenadas após limpeza.")
         return
-
-    # 📍 Criar geometria
-    try:
-        df["geometry"] = df.apply(lambda row: Point(row["NumCoordEEmpreendimento"], row["NumCoordNEmpreendimento"]), axis=1)
-        gdf = gpd.GeoDataFrame(df, geometry="geometry", crs="EPSG:4326")
-    except Exception as e:
-        st.error(f"Erro ao criar GeoDataFrame: {e}")
+    if avisar_sem_vizinhos(resultado):
         return
 
-    # 🌐 Matriz de vizinhança
-    try:
-        threshold_degraus = distancia_km / 111
-        coords = [(geom.x, geom.y) for geom in gdf.geometry]
-        w = DistanceBand(coords, threshold=threshold_degraus, binary=True, silence_warnings=True)
-    except Exception as e:
-        st.error(f"Erro ao criar matriz de vizinhança: {e}")
-        return
-
-    # 📈 Calcular Moran Global
-    try:
-        y = gdf[coluna_valor].fillna(0)
-        moran = Moran(y, w)
-    except Exception as e:
-        st.error(f"Erro ao calcular Moran's I: {e}")
-        return
+    if resultado.unidade == "hexagono":
+        st.caption(f"⬡ {len(resultado.gdf)} hexágonos de {tamanho_hex_km} km com {int(resultado.gdf['Usinas'].sum())} "
+                   "usinas, vizinhança por contiguidade.")
 
     # 📊 Exibir resultados
     st.markdown(f"""
     ### 📊 Resultados do Índice de Moran (Global)
 
-    - **Índice de Moran (I)**: `{moran.I:.4f}`
-    - **p-valor (simulado)**: `{moran.p_sim:.4f}`
+    - **Índice de Moran (I)**: `{resultado.I:.4f}`
+    - **p-valor (simulado)**: `{resultado.p_sim:.4f}`
 
     **Como interpretar:**
     - Valores de `I` positivos indicam autocorrelação espacial (valores semelhantes estão próximos).
@@ -75,54 +260,78 @@ def calcular_moran_global(df, coluna_valor="MdaPotenciaFiscalizadaKw", distancia
     """)
 
 # =============================
-# 🔍 Função: LISA Local
+# 📈 Função: Correlograma de Moran
 # =============================
-def calcular_lisa_local(df, coluna_valor="MdaPotenciaFiscalizadaKw", distancia_km=300):
-    """Calcula o índice LISA (Moran Local) e mostra um mapa de clusters com visual refinado."""
+@instrumentar()
+def exibir_correlograma(df, faixa_km=(25, 500), passo_km=25, coluna_valor="MdaPotenciaFiscalizadaKw", distancia_km=300,
+                        metodo_vizinhanca="graus", unidade="usina", tamanho_hex_km=50, agregacao="soma"):
+    """Mostra o Moran's I global ao longo de várias distâncias para ajudar a escolher a escala da vizinhança."""
 
-    st.subheader("🧭 Análise Espacial - LISA (Clusters Locais)")
+    st.subheader("📈 Correlograma de Moran")
 
-    # 🔁 Correção e validação de coordenadas
+    distancias = np.arange(faixa_km[0], faixa_km[1] + passo_km / 2, passo_km)
     try:
-        df["NumCoordNEmpreendimento"] = df["NumCoordNEmpreendimento"].astype(str).str.replace(",", ".").astype(float)
-        df["NumCoordEEmpreendimento"] = df["NumCoordEEmpreendimento"].astype(str).str.replace(",", ".").astype(float)
-        df = df.dropna(subset=["NumCoordNEmpreendimento", "NumCoordEEmpreendimento"])
-        df["geometry"] = df.apply(lambda row: Point(row["NumCoordEEmpreendimento"], row["NumCoordNEmpreendimento"]), axis=1)
-        gdf = gpd.GeoDataFrame(df, geometry="geometry", crs="EPSG:4326")
+        calculado = obter_correlograma(df, distancias, coluna_valor, metodo_vizinhanca, unidade, tamanho_hex_km, agregacao)
     except Exception as e:
-        st.error(f"Erro ao preparar dados geográficos: {e}")
+        st.error(f"Erro ao calcular o correlograma: {e}")
         return
 
-    # 🌐 Matriz de vizinhança
-    try:
-        threshold_degraus = distancia_km / 111
-        coords = [(geom.x, geom.y) for geom in gdf.geometry]
-        w = DistanceBand(coords, threshold=threshold_degraus, binary=True, silence_warnings=True)
-    except Exception as e:
-        st.error(f"Erro ao gerar vizinhança espacial: {e}")
+    if calculado is None:
+        st.warning("⚠️ Não há dados válidos de coordenadas após limpeza.")
         return
+    correlograma, usadas, total = calculado
+
+    esperado = -1 / (usadas - 1) if usadas > 1 else 0.0
+    linha = alt.Chart(correlograma).mark_line(point=True).encode(
+        x=alt.X("DistanciaKm:Q", title="Distância (km)"),
+        y=alt.Y("I:Q", title="Moran's I"),
+        tooltip=[
+            alt.Tooltip("DistanciaKm:Q", title="Distância (km)"),
+            alt.Tooltip("I:Q", title="Moran's I", format=".4f"),
+            alt.Tooltip("VizinhosMedios:Q", title="Vizinhos médios", format=".1f"),
+            alt.Tooltip("Isoladas:Q", title="Sem vizinhos"),
+        ],
+    )
+    referencias = [alt.Chart(pd.DataFrame({"y": [esperado]})).mark_rule(strokeDash=[4, 4], color="gray").encode(y="y:Q")]
+    if unidade != "hexagono":
+        referencias.append(alt.Chart(pd.DataFrame({"x": [distancia_km]})).mark_rule(color="orange").encode(x="x:Q"))
+    st.altair_chart(alt.layer(linha, *referencias), use_container_width=True)
+
+    legenda = "Linha tracejada: valor esperado sem autocorrelação, -1/(n-1)."
+    if unidade != "hexagono":
+        legenda += " Linha laranja: distância usada no Moran, no LISA e no mapa."
+    else:
+        legenda += " Distâncias entre os centros dos hexágonos."
+    if usadas < total:
+        legenda += f" Amostra aleatória de {usadas} de {total} unidades."
+    st.caption(legenda)
+
 
-    # 📈 Calcular LISA
+# =============================
+# 🔍 Função: LISA Local
+# =============================
+@instrumentar()
+def calcular_lisa_local(df, coluna_valor="MdaPotenciaFiscalizadaKw", distancia_km=300, metodo_vizinhanca="graus",
+                        unidade="usina", tamanho_hex_km=50, agregacao="soma", resultado=None):
+    """Calcula o índice LISA (Moran Local) e mostra um mapa de clusters com visual refinado."""
+
+    st.subheader("🧭 Análise Espacial - LISA (Clusters Locais)")
+
+    # 📈 LISA (resultado ESDA memorizado, compartilhado com o mapa interativo)
     try:
-        y = gdf[coluna_valor].fillna(0)
-        lisa = Moran_Local(y, w)
+        if resultado is None:
+            resultado = obter_resultado_esda(df, coluna_valor, distancia_km, metodo_vizinhanca,
+                                             unidade=unidade, tamanho_hex_km=tamanho_hex_km, agregacao=agregacao)
     except Exception as e:
         st.error(f"Erro ao calcular LISA: {e}")
         return
 
-    # 📊 Classificação dos clusters
-    cluster_labels = np.full(len(gdf), "Não Significativo")
-    sig = lisa.p_sim < 0.05
-    HH = (sig) & (lisa.q == 1)
-    LL = (sig) & (lisa.q == 3)
-    LH = (sig) & (lisa.q == 2)
-    HL = (sig) & (lisa.q == 4)
-
-    cluster_labels[HH] = "Alta-Alta 🔥"
-    cluster_labels[LL] = "Baixa-Baixa ❄️"
-    cluster_labels[LH] = "Baixa-Alta"
-    cluster_labels[HL] = "Alta-Baixa"
-    gdf["Cluster"] = cluster_labels
+    if resultado is None:
+        st.warning("⚠️ Não há dados válidos de coordenadas após limpeza.")
+        return
+    if avisar_sem_vizinhos(resultado):
+        return
+    gdf = resultado.gdf
 
     # 🎨 Visual refinado
     st.markdown("### 🗺️ Mapa de Clusters Locais (LISA)")
@@ -173,56 +382,44 @@ def calcular_lisa_local(df, coluna_valor="MdaPotenciaFiscalizadaKw", distancia_k
     except Exception as e:
         st.error(f"Erro ao gerar mapa estilizado: {e}")
 
+    # ⬇️ Exportação das estatísticas locais (CSV gerado só quando o botão é clicado)
+    st.download_button(
+        label="⬇️ Baixar clusters LISA (CSV)",
+        data=lambda: resultado.tabela().to_csv(index=False).encode("utf-8"),
+        file_name="clusters_lisa.csv",
+        mime="text/csv",
+        key="download_lisa",
+        on_click="ignore",
+    )
 
 
 
-def mapa_interativo_lisa(df, coluna_valor="MdaPotenciaFiscalizadaKw", distancia_km=300):
+
+@instrumentar()
+def mapa_interativo_lisa(df, coluna_valor="MdaPotenciaFiscalizadaKw", distancia_km=300, metodo_vizinhanca="graus",
+                         unidade="usina", tamanho_hex_km=50, agregacao="soma", resultado=None):
     st.subheader("🌐 Mapa Interativo - Clusters LISA com Folium")
 
     # 🎛️ Seleção de tiles
     tile_option = st.selectbox("🗺️ Estilo do Mapa:", [
         "OpenStreetMap", "CartoDB positron", "CartoDB dark_matter", "Stamen Terrain"
-    ])
+    ], key="estilo_mapa_lisa")
 
     try:
-        # 🔁 Coordenadas
-        df["NumCoordNEmpreendimento"] = df["NumCoordNEmpreendimento"].astype(str).str.replace(",", ".").astype(float)
-        df["NumCoordEEmpreendimento"] = df["NumCoordEEmpreendimento"].astype(str).str.replace(",", ".").astype(float)
-        df = df.dropna(subset=["NumCoordNEmpreendimento", "NumCoordEEmpreendimento"])
-        df["geometry"] = df.apply(lambda row: Point(row["NumCoordEEmpreendimento"], row["NumCoordNEmpreendimento"]), axis=1)
-        gdf = gpd.GeoDataFrame(df, geometry="geometry", crs="EPSG:4326")
-
-        # 🧠 LISA
-        threshold_degraus = distancia_km / 111
-        coords = [(geom.x, geom.y) for geom in gdf.geometry]
-        w = DistanceBand(coords, threshold=threshold_degraus, binary=True, silence_warnings=True)
-        y = gdf[coluna_valor].fillna(0)
-        lisa = Moran_Local(y, w)
-
-        cluster_labels = np.full(len(gdf), "Não Significativo")
-        sig = lisa.p_sim < 0.05
-        HH = (sig) & (lisa.q == 1)
-        LL = (sig) & (lisa.q == 3)
-        LH = (sig) & (lisa.q == 2)
-        HL = (sig) & (lisa.q == 4)
-
-        cluster_labels[HH] = "Alta-Alta 🔥"
-        cluster_labels[LL] = "Baixa-Baixa ❄️"
-        cluster_labels[LH] = "Baixa-Alta"
-        cluster_labels[HL] = "Alta-Baixa"
-        gdf["Cluster"] = cluster_labels
-
-        # 🎨 Cores
-        cor_cluster = {
-            "Alta-Alta 🔥": "red",
-            "Baixa-Baixa ❄️": "blue",
-            "Baixa-Alta": "orange",
-            "Alta-Baixa": "green",
-            "Não Significativo": "gray"
-        }
+        # 🧠 LISA (trocar só o estilo do mapa reaproveita o resultado memorizado)
+        if resultado is None:
+            resultado = obter_resultado_esda(df, coluna_valor, distancia_km, metodo_vizinhanca,
+                                             unidade=unidade, tamanho_hex_km=tamanho_hex_km, agregacao=agregacao)
+        if resultado is None:
+            st.warning("⚠️ Não há dados válidos de coordenadas após limpeza.")
+            return
+        if avisar_sem_vizinhos(resultado):
+            return
+        gdf = resultado.gdf
 
         # 🗺️ Mapa base
-        centro = [gdf.geometry.y.mean(), gdf.geometry.x.mean()]
+        minx, miny, maxx, maxy = gdf.total_bounds
+        centro = [(miny + maxy) / 2, (minx + maxx) / 2]
         mapa = folium.Map(location=centro, zoom_start=5, tiles=tile_option)
 
         # 🧭 MiniMapa
@@ -237,33 +434,47 @@ def mapa_interativo_lisa(df, coluna_valor="MdaPotenciaFiscalizadaKw", distancia_
             grupos[cluster] = folium.FeatureGroup(name=cluster, show=True)
             mapa.add_child(grupos[cluster])
 
-        # 📍 Adicionar pontos aos grupos
-        for _, row in gdf.iterrows():
-            cor = cor_cluster[row["Cluster"]]
-            folium.CircleMarker(
-                location=[row.geometry.y, row.geometry.x],
-                radius=6,
-                popup=folium.Popup(f"""
-                    <b>{row['NomEmpreendimento']}</b><br>
-                    Cluster: {row['Cluster']}<br>
-                    Potência: {row[coluna_valor]:,.2f} kW
-                """, max_width=250),
-                color=cor,
-                fill=True,
-                fill_opacity=0.85
-            ).add_to(grupos[row["Cluster"]])
+        if resultado.unidade == "hexagono":
+            # ⬡ Um polígono por hexágono, uma camada GeoJSON por cluster
+            for cluster, grupo in gdf.groupby("Cluster"):
+                folium.GeoJson(
+                    grupo[[coluna_valor, "Usinas", "Cluster", "geometry"]],
+                    style_function=lambda _, cor=CORES_CLUSTERS[cluster]: {
+                        "fillColor": cor, "color": cor, "weight": 1, "fillOpacity": 0.6
+                    },
+                    tooltip=folium.GeoJsonTooltip(
+                        fields=["Cluster", "Usinas", coluna_valor],
+                        aliases=["Cluster:", "Usinas:", f"Potência ({ROTULOS_AGREGACOES[agregacao].lower()}, kW):"],
+                        localize=True,
+                    ),
+                ).add_to(grupos[cluster])
+        else:
+            # 📍 Adicionar pontos aos grupos
+            xy = coordenadas(gdf)
+            for (lon, lat), nome, cluster, valor in zip(xy, gdf["NomEmpreendimento"].to_numpy(),
+                                                         gdf["Cluster"].to_numpy(), gdf[coluna_valor].to_numpy()):
+                folium.CircleMarker(
+                    location=[float(lat), float(lon)],
+                    radius=6,
+                    popup=folium.Popup(f"""
+                        <b>{nome}</b><br>
+                        Cluster: {cluster}<br>
+                        Potência: {valor:,.2f} kW
+                    """, max_width=250),
+                    color=CORES_CLUSTERS[cluster],
+                    fill=True,
+                    fill_opacity=0.85
+                ).add_to(grupos[cluster])
 
         # ✅ Camada de controle
         folium.LayerControl(collapsed=False).add_to(mapa)
 
         # 🔁 Fit bounds
-        bounds = gdf.geometry.bounds
-        sw = [bounds.miny.min(), bounds.minx.min()]
-        ne = [bounds.maxy.max(), bounds.maxx.max()]
-        mapa.fit_bounds([sw, ne])
+        mapa.fit_bounds([[miny, minx], [maxy, maxx]])
 
         # Renderizar
-        folium_static(mapa, width=1000, height=600)
+        with medir("folium: serializar mapa LISA"):
+            folium_static(mapa, width=1000, height=600)
 
     except Exception as e:
         st.error(f"Erro ao gerar o mapa interativo: {e}")
@@ -0,0 +1,66 @@
+import io
+import os
+import pandas as pd
+from cache_lru import CacheLRU, assinatura_de
+from tabela_paginada import posicoes_visiveis
+
+# 📤 Exportação sob demanda: o arquivo só é gerado no clique e fica memorizado por estado de filtro
+FORMATOS_EXPORTACAO = {
+    "csv": ("CSV", "text/csv"),
+    "parquet": ("Parquet", "application/vnd.apache.parquet"),
+    "xlsx": ("Excel (XLSX)", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+LINHAS_POR_BLOCO = int(os.environ.get("LINHAS_POR_BLOCO_EXPORTACAO", "100000"))
+LIMITE_LINHAS_XLSX = 1_048_575  # limite de linhas de uma planilha do Excel, descontado o cabeçalho
+
+cache_exportacoes = CacheLRU(int(os.environ.get("CACHE_EXPORTACOES_MB", "128")) * 1024 * 1024)
+
+
+def gerar_csv(df):
+    """CSV em UTF-8 escrito em blocos de LINHAS_POR_BLOCO linhas, sem montar o texto inteiro de uma vez."""
+    buffer = io.BytesIO()
+    for inicio in range(0, max(len(df), 1), LINHAS_POR_BLOCO):
+        bloco = df.iloc[inicio:inicio + LINHAS_POR_BLOCO]
+        buffer.write(bloco.to_csv(index=False, header=inicio == 0).encode("utf-8"))
+    return buffer.getvalue()
+
+
+def gerar_parquet(df):
+    buffer = io.BytesIO()
+    df.to_parquet(buffer, index=False)
+    return buffer.getvalue()
+
+
+def gerar_xlsx(df):
+    if len(df) > LIMITE_LINHAS_XLSX:
+        raise ValueError(f"O Excel comporta até {LIMITE_LINHAS_XLSX} linhas; use CSV ou Parquet.")
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine="xlsxwriter") as writer:
+        df.to_excel(writer, index=False, sheet_name="Dados filtrados")
+    return buffer.getvalue()
+
+
+GERADORES = {"csv": gerar_csv, "parquet": gerar_parquet, "xlsx": gerar_xlsx}
+
+
+def exportar(df, colunas, formato, busca="", coluna_ordem=None, crescente=True):
+    """Bytes do arquivo `formato` com as `colunas` das linhas visíveis (busca e ordenação da tabela aplicadas).
+
+    Memorizado pela assinatura do DataFrame filtrado e pelos parâmetros da visão: baixar de novo a mesma
+    visão não gera o arquivo outra vez.
+    """
+    assinatura = assinatura_de(df)
+    chave = (assinatura, tuple(colunas), busca.strip(), coluna_ordem, crescente, formato)
+    if assinatura is not None:
+        conteudo = cache_exportacoes.obter(chave)
+        if conteudo is not None:
+            return conteudo
+
+    posicoes = posicoes_visiveis(df, colunas, busca, coluna_ordem, crescente)
+    tabela = df.iloc[posicoes][colunas]
+    tabela.attrs = {}  # o Parquet grava `attrs` nos metadados; as assinaturas internas não são exportáveis
+    conteudo = GERADORES[formato](tabela)
+
+    if assinatura is not None:
+        cache_exportacoes.guardar(chave, conteudo)
+    return conteudo
@@ -1,13 +1,29 @@
 import os
+from armazenamento import dataset_existe, ler_manifesto, listar_datasets
 
 UPLOAD_DIR = "uploaded_files"
 
 def listar_arquivos():
-    """Lista os arquivos CSV disponíveis para análise."""
-    return [f for f in os.listdir(UPLOAD_DIR) if f.endswith(".csv")]
+    """Lista os datasets (CSVs já convertidos para Parquet) disponíveis para análise."""
+    return listar_datasets()
+
+def listar_arquivos_pendentes():
+    """Lista os CSVs de uploaded_files ainda não ingeridos, alterados ou gravados em esquema antigo."""
+    datasets = ler_manifesto()["datasets"]
+    pendentes = []
+    for f in os.listdir(UPLOAD_DIR):
+        if not f.endswith(".csv"):
+            continue
+        info = os.stat(os.path.join(UPLOAD_DIR, f))
+        registro = datasets.get(f)
+        if (registro is None or not dataset_existe(registro["hash"])
+                or (registro["mtime_ns"], registro["tamanho"]) != (info.st_mtime_ns, info.st_size)):
+            pendentes.append(f)
+    return pendentes
 
 def salvar_arquivo(uploaded_file):
-    """Salva um arquivo enviado pelo usuário."""
+    """Salva um arquivo enviado pelo usuário e retorna o caminho gravado."""
     file_path = os.path.join(UPLOAD_DIR, uploaded_file.name)
     with open(file_path, "wb") as f:
         f.write(uploaded_file.getbuffer())
+    return file_path
@@ -1,5 +1,16 @@
+import os
+import threading
+from collections import OrderedDict
 import streamlit as st
 import pandas as pd
+import numpy as np
+from cache_lru import CacheLRU, assinar, assinatura_de
+from instrumentacao import instrumentar
+
+COLUNAS_FILTRO_CATEGORIA = ["DscOrigemCombustivel", "NomFonteCombustivel", "SigUFPrincipal"]
+
+# 🗂️ Índices de filtro compartilhados entre sessões (um por dataset carregado)
+cache_indices = CacheLRU(int(os.environ.get("CACHE_INDICES_MB", "256")) * 1024 * 1024)
 
 def inicializar_filtros():
     """Garante que os filtros estejam inicializados no session_state."""
@@ -8,12 +19,84 @@ def inicializar_filtros():
         if key not in st.session_state:
             st.session_state[key] = [] if key in ["origem_combustivel", "fonte_combustivel", "estados"] else None
 
-def aplicar_filtros(df):
-    """Aplica os filtros ao DataFrame com base em mês e ano."""
-    # Extrair ano e mês de DatInicioVigencia
-    df_ano = df["DatInicioVigencia"].dt.year
-    df_mes = df["DatInicioVigencia"].dt.month
 
+def chave_filtro(inicio_data_num, fim_data_num, origens, fontes, estados):
+    """Chave hashable de um estado de filtro (independente da ordem das seleções)."""
+    return (inicio_data_num, fim_data_num, frozenset(origens), frozenset(fontes), frozenset(estados))
+
+
+class IndiceFiltros:
+    """Índice construído uma vez por dataset para responder aos filtros da sidebar sem varrer o DataFrame.
+
+    - Datas: chaves ano-mês pré-ordenadas, com o intervalo encontrado por busca binária.
+    - Origem, fonte e UF: códigos inteiros das categorias, filtrados por tabela de consulta.
+    - Máscaras dos estados de filtro mais recentes são memorizadas.
+    """
+
+    def __init__(self, df, max_mascaras=16):
+        chaves = df["ChaveAnoMes"].to_numpy()
+        self._ordem = np.argsort(chaves, kind="stable")
+        self._chaves_ordenadas = chaves[self._ordem]
+        self._codigos = {}
+        self._categorias = {}
+        for col in COLUNAS_FILTRO_CATEGORIA:
+            serie = df[col] if df[col].dtype == "category" else df[col].astype("category")
+            self._codigos[col] = serie.cat.codes.to_numpy()
+            self._categorias[col] = {valor: i for i, valor in enumerate(serie.cat.categories)}
+        self._n = len(df)
+        self._max_mascaras = max_mascaras
+        self._mascaras = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self):
+        return (self._ordem.nbytes + self._chaves_ordenadas.nbytes
+                + sum(c.nbytes for c in self._codigos.values())
+                + self._max_mascaras * self._n)  # espaço reservado para as máscaras memorizadas
+
+    def _mascara_categoria(self, col, valores):
+        categorias = self._categorias[col]
+        # Posição extra (-1) corresponde a valores ausentes, que nunca passam no filtro
+        permitidos = np.zeros(len(categorias) + 1, dtype=bool)
+        permitidos[[categorias[v] for v in valores if v in categorias]] = True
+        return permitidos[self._codigos[col]]
+
+    def mascara(self, inicio_data_num, fim_data_num, origens, fontes, estados):
+        """Máscara booleana das linhas que atendem ao período (ano * 12 + mês) e às categorias."""
+        chave = chave_filtro(inicio_data_num, fim_data_num, origens, fontes, estados)
+        with self._lock:
+            if chave in self._mascaras:
+                self._mascaras.move_to_end(chave)
+                return self._mascaras[chave]
+
+        mascara = np.zeros(self._n, dtype=bool)
+        inicio = np.searchsorted(self._chaves_ordenadas, inicio_data_num, side="left")
+        fim = np.searchsorted(self._chaves_ordenadas, fim_data_num, side="right")
+        mascara[self._ordem[inicio:fim]] = True
+
+        for col, valores in zip(COLUNAS_FILTRO_CATEGORIA, (origens, fontes, estados)):
+            mascara &= self._mascara_categoria(col, valores)
+        mascara.flags.writeable = False  # compartilhada entre reruns e sessões
+
+        with self._lock:
+            self._mascaras[chave] = mascara
+            if len(self._mascaras) > self._max_mascaras:
+                self._mascaras.popitem(last=False)
+        return mascara
+
+
+def obter_indice(df):
+    """Retorna o índice de filtros do dataset, construindo-o apenas na primeira vez."""
+    assinatura = assinatura_de(df)
+    if assinatura is None:
+        return IndiceFiltros(df)
+    indice = cache_indices.obter(assinatura)
+    if indice is None:
+        indice = cache_indices.guardar(assinatura, IndiceFiltros(df))
+    return indice
+
+def filtros_da_sessao():
+    """Estado atual dos filtros da sidebar: (início, fim) como ano * 12 + mês, origens, fontes e estados."""
     # Valores do session_state
     inicio_ano = st.session_state.inicio_ano
     inicio_mes = st.session_state.inicio_mes
@@ -21,14 +104,20 @@ def aplicar_filtros(df):
     fim_mes = st.session_state.fim_mes
 
     # Converter para um número comparável (ano * 12 + mês)
-    df_data_num = df_ano * 12 + df_mes
     inicio_data_num = inicio_ano * 12 + inicio_mes
     fim_data_num = fim_ano * 12 + fim_mes
 
-    return df[
-        (df_data_num >= inicio_data_num) &
-        (df_data_num <= fim_data_num) &
-        (df["DscOrigemCombustivel"].isin(st.session_state.origem_combustivel)) &
-        (df["NomFonteCombustivel"].isin(st.session_state.fonte_combustivel)) &
-        (df["SigUFPrincipal"].isin(st.session_state.estados))
-    ]
\ No newline at end of file
+    return (inicio_data_num, fim_data_num, st.session_state.origem_combustivel,
+            st.session_state.fonte_combustivel, st.session_state.estados)
+
+@instrumentar()
+def aplicar_filtros(df, filtros=None):
+    """Aplica os filtros ao DataFrame com base em mês e ano (por padrão, os da sidebar da sessão)."""
+    filtros = filtros or filtros_da_sessao()
+    df_filtrado = df[obter_indice(df).mascara(*filtros)]
+
+    # Assinatura do resultado = dataset de origem + estado do filtro (base para caches posteriores)
+    assinatura = assinatura_de(df)
+    if assinatura is not None:
+        assinar(df_filtrado, ("filtro", assinatura, chave_filtro(*filtros)))
+    return df_filtrado
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from pesos_espaciais import CRS_PROJETADO, projetar, matriz_para_pesos
+
+# ⬡ Grade hexagonal (hexágonos "pontudos", coordenadas axiais q, r) na projeção Policônica do Brasil
+RAIZ3 = np.sqrt(3)
+DESLOCAMENTO_CHAVE = 1 << 20
+AGREGACOES = {"soma": "sum", "media": "mean"}
+ROTULOS_AGREGACOES = {"soma": "Soma da potência", "media": "Potência média"}
+
+# Três das seis direções vizinhas: as outras três são os mesmos pares no sentido oposto
+DIRECOES_VIZINHAS = [(1, 0), (1, -1), (0, -1)]
+
+
+def hexagono_de(xy, tamanho_m):
+    """Coordenadas axiais (q, r) do hexágono de raio `tamanho_m` que contém cada ponto projetado (em metros)."""
+    q = (RAIZ3 / 3 * xy[:, 0] - xy[:, 1] / 3) / tamanho_m
+    r = (2 / 3 * xy[:, 1]) / tamanho_m
+    s = -q - r
+
+    # Arredondamento cúbico: corrige a coordenada com maior erro para manter q + r + s = 0
+    qa, ra, sa = np.round(q), np.round(r), np.round(s)
+    dq, dr, ds = np.abs(qa - q), np.abs(ra - r), np.abs(sa - s)
+    corrigir_q = (dq > dr) & (dq > ds)
+    corrigir_r = ~corrigir_q & (dr > ds)
+    qa = np.where(corrigir_q, -ra - sa, qa)
+    ra = np.where(corrigir_r, -qa - sa, ra)
+    return qa.astype(np.int64), ra.astype(np.int64)
+
+
+def chave_hexagono(q, r):
+    """Inteiro único por hexágono (q e r deslocados para ficarem positivos)."""
+    return (q + DESLOCAMENTO_CHAVE) * (DESLOCAMENTO_CHAVE * 2) + (r + DESLOCAMENTO_CHAVE)
+
+
+def poligonos_hexagonos(q, r, tamanho_m):
+    """Polígonos (em metros) dos hexágonos, construídos em lote a partir dos centros."""
+    cx = tamanho_m * (RAIZ3 * q + RAIZ3 / 2 * r)
+    cy = tamanho_m * 1.5 * r
+    angulos = np.radians(60 * np.arange(6) - 30)
+    vertices = np.stack([cx[:, None] + tamanho_m * np.cos(angulos), cy[:, None] + tamanho_m * np.sin(angulos)], axis=-1)
+    return shapely.polygons(vertices)
+
+
+def agregar_hexagonos(df, coluna_valor="MdaPotenciaFiscalizadaKw", tamanho_km=50, agregacao="soma"):
+    """Agrega as usinas com coordenadas válidas em hexágonos de raio `tamanho_km`.
+
+    Retorna um GeoDataFrame (EPSG:4326) com um polígono por hexágono ocupado, a potência somada ou média
+    (na própria `coluna_valor`), o número de usinas (`Usinas`) e as coordenadas axiais `q`, `r`.
+    """
+    df = df[df["CoordenadaValida"]]
+    coords = np.column_stack([df["NumCoordEEmpreendimento"].to_numpy(dtype="float64"),
+                              df["NumCoordNEmpreendimento"].to_numpy(dtype="float64")])
+    tamanho_m = tamanho_km * 1000
+    q, r = hexagono_de(projetar(coords), tamanho_m)
+
+    unidades = (
+        pd.DataFrame({"chave": chave_hexagono(q, r), "q": q, "r": r, "valor": df[coluna_valor].fillna(0).to_numpy()})
+        .groupby("chave", sort=True)
+        .agg(q=("q", "first"), r=("r", "first"), valor=("valor", AGREGACOES[agregacao]), Usinas=("valor", "size"))
+        .reset_index()
+        .rename(columns={"valor": coluna_valor})
+    )
+    geometria = poligonos_hexagonos(unidades["q"].to_numpy(), unidades["r"].to_numpy(), tamanho_m)
+    return gpd.GeoDataFrame(unidades, geometry=geometria, crs=CRS_PROJETADO).to_crs("EPSG:4326")
+
+
+def pesos_contiguidade(unidades):
+    """Vizinhança por contiguidade entre hexágonos ocupados (lados compartilhados), padronizada por linha."""
+    chaves = unidades["chave"].to_numpy()  # ordenadas pela agregação
+    q, r = unidades["q"].to_numpy(), unidades["r"].to_numpy()
+    origem, destino = [], []
+    for dq, dr in DIRECOES_VIZINHAS:
+        vizinha = chave_hexagono(q + dq, r + dr)
+        posicao = np.minimum(np.searchsorted(chaves, vizinha), len(chaves) - 1)
+        existe = chaves[posicao] == vizinha
+        origem.append(np.flatnonzero(existe))
+        destino.append(posicao[existe])
+    pares = np.column_stack([np.concatenate(origem), np.concatenate(destino)])
+    return matriz_para_pesos(pares, len(unidades))
@@ -0,0 +1,218 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+# 🎲 Inferência por permutação do Moran's I global e do LISA (Moran local) com operações esparsas
+SEMENTE_PADRAO = 12345
+NIVEL_SIGNIFICANCIA = 0.05
+MEMORIA_LOTE_MB = int(os.environ.get("MEMORIA_LOTE_ESDA_MB", "64"))
+RODADAS_MINIMAS = 10
+# Pool de processos opcional (o app roda em threads do Streamlit, onde fork não é seguro): iniciado
+# por forkserver/spawn, que recebem a matriz uma vez por processo no initializer
+PROCESSOS_ESDA = int(os.environ.get("PROCESSOS_ESDA", "1"))
+INICIO_PROCESSOS_ESDA = os.environ.get(
+    "INICIO_PROCESSOS_ESDA", "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+
+# Contexto de cada processo (matriz e valores enviados uma única vez, no initializer do pool)
+_contexto = {}
+
+
+class InferenciaMoran:
+    """Moran's I global e local com p-valores por permutação, nas mesmas convenções do `esda`.
+
+    - Global: permutação total dos valores (como `esda.Moran`).
+    - Local: aleatorização condicional, com o valor da usina fixo e os vizinhos sorteados entre
+      as demais (como `esda.Moran_Local`). Quadrantes: 1 = Alta-Alta, 2 = Baixa-Alta,
+      3 = Baixa-Baixa, 4 = Alta-Baixa.
+    - `permutacoes_usadas`: permutações avaliadas por usina, menor que `permutacoes` quando a
+      parada antecipada já decidiu a significância ao nível usado na rotulagem dos clusters.
+    """
+
+    def __init__(self, I, p_sim, Is, p_sim_local, q, permutacoes, permutacoes_usadas, permutacoes_global):
+        self.I = I
+        self.p_sim = p_sim
+        self.Is = Is
+        self.p_sim_local = p_sim_local
+        self.q = q
+        self.permutacoes = permutacoes
+        self.permutacoes_usadas = permutacoes_usadas
+        self.permutacoes_global = permutacoes_global
+
+
+def _definir_contexto(matriz, z, Is, escala_local, escala_global):
+    """Guarda no processo atual a matriz (CSR ordenada), os valores padronizados e as escalas das estatísticas."""
+    n = matriz.shape[0]
+    linhas = np.repeat(np.arange(n, dtype=np.int64), np.diff(matriz.indptr))
+    _contexto.update(
+        matriz=matriz, z=z, Is=Is, escala_local=escala_local, escala_global=escala_global,
+        chaves=linhas * n + matriz.indices,  # (i, j) de cada peso, crescente por ser CSR ordenada
+    )
+
+
+def _simular_lote(linhas, calcular_global, tamanho, semente, indice_lote):
+    """Simula `tamanho` permutações; retorna, para as `linhas`, quantas estatísticas locais simuladas são
+    >= a observada e, se pedido, as estatísticas globais simuladas.
+
+    O gerador de cada lote deriva de (semente, índice do lote): o resultado não depende do número de
+    processos nem de quais usinas ainda estão em aberto.
+    """
+    matriz, z, chaves = _contexto["matriz"], _contexto["z"], _contexto["chaves"]
+    n = len(z)
+    rng = np.random.default_rng([semente, indice_lote])
+
+    # permutacao[b, j] = índice do valor que a posição j recebe na permutação b
+    permutacao = rng.permuted(np.broadcast_to(np.arange(n), (tamanho, n)), axis=1)
+    z_perm = z[permutacao].T  # (n, tamanho)
+
+    sims_global = None
+    if calcular_global:
+        defasagem_total = matriz @ z_perm
+        sims_global = _contexto["escala_global"] * np.einsum("ij,ij->j", z_perm, defasagem_total)
+    if len(linhas) == 0:
+        return np.zeros(0, dtype=np.int64), sims_global
+    defasagem = defasagem_total[linhas] if calcular_global else matriz[linhas] @ z_perm
+
+    # Aleatorização condicional: o vizinho j que recebeu o próprio valor de i (permutacao[b, j] == i)
+    # passa a receber o valor enviado à posição i, que nunca está entre os sorteados para os vizinhos
+    inversa = np.empty_like(permutacao)
+    np.put_along_axis(inversa, permutacao, np.broadcast_to(np.arange(n), permutacao.shape), axis=1)
+    inversa = inversa[:, linhas].T  # (linhas, tamanho): posição que recebeu o valor de i
+    consulta = linhas[:, None].astype(np.int64) * n + inversa
+    posicao = np.minimum(np.searchsorted(chaves, consulta), len(chaves) - 1)
+    peso = np.where(chaves[posicao] == consulta, matriz.data[posicao], 0.0)
+    z_i = z[linhas][:, None]
+    defasagem = defasagem + peso * (z[permutacao[:, linhas].T] - z_i)
+
+    sims_local = _contexto["escala_local"] * z_i * defasagem
+    return (sims_local >= _contexto["Is"][linhas][:, None]).sum(axis=1), sims_global
+
+
+def tamanho_lote(n, permutacoes, memoria_mb=MEMORIA_LOTE_MB, rodadas_minimas=RODADAS_MINIMAS):
+    """Permutações por lote: cabe em `memoria_mb` (~11 vetores de n por permutação) e deixa ao menos
+    `rodadas_minimas` pontos de verificação para a parada antecipada.
+
+    Depende só de n e do total, para que a divisão em lotes (e portanto os sorteios) seja sempre a mesma.
+    """
+    por_memoria = int(memoria_mb * 1024 * 1024 // (11 * n * 8))
+    return max(1, min(por_memoria, -(-permutacoes // rodadas_minimas)))
+
+
+def p_valor(maiores, avaliadas):
+    """p-valor simulado bicaudal do `esda`: (min(maiores, avaliadas - maiores) + 1) / (avaliadas + 1)."""
+    return (np.minimum(maiores, avaliadas - maiores) + 1.0) / (avaliadas + 1.0)
+
+
+def decididas(maiores, avaliadas, permutacoes, nivel=NIVEL_SIGNIFICANCIA):
+    """Estatísticas cujo rótulo (p < nivel ou não) já não muda até `permutacoes`, qualquer que seja o restante.
+
+    O lado menor da contagem só pode crescer (não significativa) e cresce no máximo o que falta (significativa).
+    """
+    menor = np.minimum(maiores, avaliadas - maiores)
+    nao_significativa = (menor + 1.0) / (permutacoes + 1.0) >= nivel
+    significativa = (menor + (permutacoes - avaliadas) + 1.0) / (permutacoes + 1.0) < nivel
+    return nao_significativa | significativa
+
+
+def inferencia_moran(y, w, permutacoes=999, semente=SEMENTE_PADRAO, parada_antecipada=True,
+                     nivel=NIVEL_SIGNIFICANCIA, processos=None, memoria_lote_mb=MEMORIA_LOTE_MB, ao_progredir=None):
+    """Calcula Moran's I global e local de `y` na matriz `w` (libpysal W, padronizada por linha).
+
+    As permutações são sorteadas em lotes limitados por `memoria_lote_mb` e, com `processos` > 1,
+    distribuídas num pool de processos. Com `parada_antecipada`, usinas cuja significância ao `nivel`
+    já está decidida deixam de ser simuladas; os rótulos são os mesmos da execução completa.
+    `ao_progredir(feitas, permutacoes, mensagem)` é chamado após cada lote (pode levantar para interromper).
+    """
+    matriz = w.sparse.tocsr().astype("float64")
+    matriz.sort_indices()
+    n = matriz.shape[0]
+
+    y = np.asarray(y, dtype="float64")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = (y - y.mean()) / y.std()
+        soma_quadrados = (z * z).sum()
+        defasagem = matriz @ z
+        escala_global = n / matriz.sum() / soma_quadrados
+        escala_local = (n - 1) / soma_quadrados
+        I = float(escala_global * (z @ defasagem))
+        Is = escala_local * z * defasagem
+
+    # Quadrantes na convenção do esda (q = 1, 2, 3, 4 para AA, BA, BB, AB)
+    alto, vizinhanca_alta = z > 0, defasagem > 0
+    q = np.select([alto & vizinhanca_alta, ~alto & vizinhanca_alta, ~alto & ~vizinhanca_alta], [1, 2, 3], 4)
+
+    if matriz.nnz == 0:
+        # Nenhuma unidade tem vizinhos (um único hexágono, distância curta): as estatísticas não são definidas
+        return InferenciaMoran(I=float("nan"), p_sim=1.0, Is=np.full(n, np.nan), p_sim_local=np.ones(n), q=q,
+                               permutacoes=permutacoes, permutacoes_usadas=np.zeros(n, dtype=np.int64),
+                               permutacoes_global=0)
+
+    maiores = np.zeros(n, dtype=np.int64)
+    avaliadas = np.zeros(n, dtype=np.int64)
+    maiores_global = avaliadas_global = 0
+    em_aberto = np.ones(n, dtype=bool)
+    global_aberto = True
+
+    processos = max(1, processos or PROCESSOS_ESDA)
+    executor = None
+    if processos > 1:
+        executor = ProcessPoolExecutor(max_workers=processos, initializer=_definir_contexto,
+                                       initargs=(matriz, z, Is, escala_local, escala_global),
+                                       mp_context=multiprocessing.get_context(INICIO_PROCESSOS_ESDA))
+    else:
+        _definir_contexto(matriz, z, Is, escala_local, escala_global)
+
+    try:
+        tamanho = tamanho_lote(n, permutacoes, memoria_lote_mb)
+        indice_lote = 0
+        feitas = processadas = 0
+        while feitas < permutacoes and (em_aberto.any() or global_aberto):
+            # Uma rodada = um lote por processo, todos com as usinas em aberto no início da rodada
+            rodada = []
+            while len(rodada) < processos and feitas < permutacoes:
+                rodada.append((indice_lote, min(tamanho, permutacoes - feitas)))
+                feitas += rodada[-1][1]
+                indice_lote += 1
+
+            linhas = np.flatnonzero(em_aberto)
+            calcular_global = global_aberto
+            argumentos = [(linhas, calcular_global, t, semente, i) for i, t in rodada]
+            if executor is None:
+                resultados = [_simular_lote(*a) for a in argumentos]
+            else:
+                resultados = list(executor.map(_simular_lote, *zip(*argumentos)))
+
+            # Lotes contabilizados em ordem, com a parada decidida após cada um: o resultado é o mesmo
+            # com qualquer número de processos
+            for (_, t), (maiores_lote, sims_global) in zip(rodada, resultados):
+                ainda = em_aberto[linhas]
+                abertas = linhas[ainda]
+                maiores[abertas] += maiores_lote[ainda]
+                avaliadas[abertas] += t
+                if calcular_global and global_aberto:
+                    maiores_global += int((sims_global >= I).sum())
+                    avaliadas_global += t
+
+                if parada_antecipada:
+                    em_aberto[abertas[decididas(maiores[abertas], avaliadas[abertas], permutacoes, nivel)]] = False
+                    global_aberto = global_aberto and not decididas(maiores_global, avaliadas_global,
+                                                                    permutacoes, nivel)
+
+                processadas += t
+                if ao_progredir is not None:
+                    ao_progredir(processadas, permutacoes,
+                                 f"{processadas} de {permutacoes} permutações · {int(em_aberto.sum())} unidades em aberto")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    return InferenciaMoran(
+        I=I,
+        p_sim=float(p_valor(maiores_global, avaliadas_global)),
+        Is=Is,
+        p_sim_local=p_valor(maiores, avaliadas),
+        q=q,
+        permutacoes=permutacoes,
+        permutacoes_usadas=avaliadas,
+        permutacoes_global=avaliadas_global,
+    )
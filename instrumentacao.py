@@ -0,0 +1,143 @@
+import datetime
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# ⏱️ Instrumentação por etapa: tempo de parede, linhas processadas e pico de memória alocada.
+# Ligada para todos por INSTRUMENTACAO=1 ou por sessão no toggle "Diagnóstico" da sidebar; o pico de
+# memória (tracemalloc, global ao processo) só é medido com INSTRUMENTACAO=1, nunca pelo toggle.
+INSTRUMENTACAO_ATIVA = os.environ.get("INSTRUMENTACAO", "0") == "1"
+ARQUIVO_MEDICOES = os.environ.get("INSTRUMENTACAO_ARQUIVO")  # JSON lines acumulado entre sessões
+MAX_MEDICOES_SESSAO = 5000
+
+_pilhas = threading.local()
+_lock_arquivo = threading.Lock()
+
+
+def contexto_script():
+    """Contexto da execução do script, ou None fora dela (ex.: tarefas em segundo plano)."""
+    return get_script_run_ctx(suppress_warning=True)
+
+
+def ativa():
+    if INSTRUMENTACAO_ATIVA:
+        return True
+    return contexto_script() is not None and st.session_state.get("instrumentacao_ativa", False)
+
+
+def iniciar_execucao():
+    """Marca o início de uma execução completa do script: as medições seguintes ficam agrupadas sob ela."""
+    st.session_state.execucao_instrumentada = st.session_state.get("execucao_instrumentada", 0) + 1
+
+
+def registrar(medicao):
+    """Guarda a medição no histórico da sessão e, se configurado, no arquivo JSON lines."""
+    contexto = contexto_script()
+    if contexto is not None:
+        medicao["sessao"] = contexto.session_id
+        medicao["execucao"] = st.session_state.get("execucao_instrumentada", 0)
+        historico = st.session_state.setdefault("medicoes", [])
+        historico.append(medicao)
+        del historico[:-MAX_MEDICOES_SESSAO]
+    if ARQUIVO_MEDICOES:
+        with _lock_arquivo, open(ARQUIVO_MEDICOES, "a", encoding="utf-8") as arquivo:
+            arquivo.write(json.dumps(medicao, ensure_ascii=False, default=str) + "\n")
+
+
+@contextmanager
+def medir(etapa, linhas=None):
+    """Mede a etapa do bloco `with`; o bloco pode preencher `medicao["linhas"]` depois de calcular.
+
+    Com INSTRUMENTACAO=1, registra também o pico da memória alocada pelo Python e pelo NumPy durante a
+    etapa (tracemalloc). O contador de pico é do processo: com outras sessões ou threads medindo ao mesmo
+    tempo, os picos não são confiáveis. Pelo toggle da sessão, só tempo e linhas (`pico_mb` fica None).
+    """
+    if not ativa():
+        yield {}
+        return
+    medicao = {"instante": datetime.datetime.now().isoformat(timespec="seconds"), "etapa": etapa, "linhas": linhas,
+               "pico_mb": None}
+    if not INSTRUMENTACAO_ATIVA:
+        inicio = time.perf_counter()
+        try:
+            yield medicao
+        finally:
+            medicao["segundos"] = round(time.perf_counter() - inicio, 4)
+            registrar(medicao)
+        return
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+    # Etapas aninhadas: o pico da etapa externa é preservado antes de a interna zerar o contador
+    pilha = _pilhas.__dict__.setdefault("pilha", [])
+    atual, pico = tracemalloc.get_traced_memory()
+    if pilha:
+        pilha[-1]["pico"] = max(pilha[-1]["pico"], pico)
+    tracemalloc.reset_peak()
+    quadro = {"base": atual, "pico": atual}
+    pilha.append(quadro)
+
+    inicio = time.perf_counter()
+    try:
+        yield medicao
+    finally:
+        medicao["segundos"] = round(time.perf_counter() - inicio, 4)
+        pico = max(quadro["pico"], tracemalloc.get_traced_memory()[1])
+        pilha.pop()
+        if pilha:
+            pilha[-1]["pico"] = max(pilha[-1]["pico"], pico)
+        medicao["pico_mb"] = round((pico - quadro["base"]) / 1024 ** 2, 2)
+        registrar(medicao)
+
+
+def linhas_de(resultado, args):
+    """Linhas do DataFrame devolvido, ou do primeiro DataFrame recebido."""
+    for valor in (resultado, *args):
+        if isinstance(valor, pd.DataFrame):
+            return len(valor)
+    return None
+
+
+def instrumentar(etapa=None):
+    """Decorador: mede cada chamada da função como uma etapa (por padrão, com o nome da função)."""
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def medida(*args, **kwargs):
+            if not ativa():
+                return funcao(*args, **kwargs)
+            with medir(etapa or funcao.__name__) as medicao:
+                resultado = funcao(*args, **kwargs)
+                medicao["linhas"] = linhas_de(resultado, args)
+            return resultado
+        return medida
+    return decorador
+
+
+def exibir_instrumentacao():
+    """Painel recolhível com as etapas da última execução e o histórico da sessão em JSON lines."""
+    if not ativa():
+        return
+    historico = st.session_state.get("medicoes", [])
+    execucao = st.session_state.get("execucao_instrumentada", 0)
+    ultimas = pd.DataFrame([m for m in historico if m.get("execucao") == execucao],
+                           columns=["etapa", "segundos", "pico_mb", "linhas"])
+    with st.expander(f"⏱️ Instrumentação: execução {execucao} "
+                     f"({ultimas['segundos'].sum():.2f} s em {len(ultimas)} etapas)", expanded=False):
+        st.dataframe(ultimas.rename(columns={"etapa": "Etapa", "segundos": "Tempo (s)",
+                                             "pico_mb": "Pico de memória (MB)", "linhas": "Linhas"}),
+                     hide_index=True)
+        legenda = "Fragmentos (seções, botões internos) registram na execução completa mais recente."
+        if not INSTRUMENTACAO_ATIVA:
+            legenda += " Pico de memória só com INSTRUMENTACAO=1 (medição global ao processo)."
+        st.caption(legenda)
+        st.download_button("📥 Baixar medições da sessão (JSON lines)",
+                           lambda: "".join(json.dumps(m, ensure_ascii=False, default=str) + "\n" for m in historico),
+                           "medicoes.jsonl", "application/jsonl", on_click="ignore")
@@ -1,25 +1,311 @@
 import streamlit as st
 import datetime
+import os
 from data_loader import carregar_dados
+from atualizacao_incremental import ingerir_snapshot
 from filters import inicializar_filtros, aplicar_filtros
+from agregados import fatiar_cubo
+from cache_lru import assinar, assinatura_de
 from visualizations import exibir_indicadores, grafico_temporal, grafico_barras, mapa_usinas, grafico_barra_com_media_anual
-from file_manager import listar_arquivos, salvar_arquivo
-from esda_analysis import calcular_moran_global, calcular_lisa_local, mapa_interativo_lisa
+from file_manager import listar_arquivos, listar_arquivos_pendentes, salvar_arquivo, UPLOAD_DIR
+from esda_analysis import (calcular_moran_global, calcular_lisa_local, mapa_interativo_lisa, exibir_correlograma,
+                           obter_resultado_esda, ROTULOS_UNIDADES, LIMITE_USINAS_PONTUAL)
+from tabela_paginada import TAMANHOS_PAGINA, posicoes_visiveis, fatiar_pagina
+from exportacao import FORMATOS_EXPORTACAO, LIMITE_LINHAS_XLSX, exportar
+from instrumentacao import iniciar_execucao, medir, exibir_instrumentacao
+from tarefas import executor_tarefas, ERRO, CANCELADA
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from pesos_espaciais import ROTULOS_METODOS
+from grade_hexagonal import ROTULOS_AGREGACOES
+
+
+# =============================
+# 🧩 Seções do painel
+# =============================
+# Só a seção escolhida é executada a cada rerun; widgets internos de cada seção (fragmentos)
+# reexecutam apenas a própria seção, sem recarregar nem refiltrar os dados.
+SECOES = {
+    "tabela": "📋 Tabela de Dados",
+    "graficos": "📊 Gráficos",
+    "mapa": "🗺️ Mapa Geoespacial",
+    "espacial": "📌 Análise Espacial",
+}
+
+
+def voltar_primeira_pagina():
+    st.session_state.pagina_tabela = 1
+
+
+@st.fragment
+def secao_tabela(df_filtrado, colunas_existentes):
+    st.subheader("📌 Dados Filtrados")
+
+    # 🔎 Busca, ordenação e paginação feitas no servidor: só a página visível é enviada ao navegador
+    col_busca, col_ordem, col_sentido, col_tamanho = st.columns([3, 2, 1, 1])
+    busca = col_busca.text_input("🔎 Buscar", key="busca_tabela", on_change=voltar_primeira_pagina,
+                                 placeholder="Nome, UF, fase, tipo de outorga...")
+    coluna_ordem = col_ordem.selectbox(
+        "Ordenar por", colunas_existentes, key="ordem_tabela", on_change=voltar_primeira_pagina,
+        index=colunas_existentes.index("DatInicioVigencia") if "DatInicioVigencia" in colunas_existentes else 0
+    )
+    crescente = col_sentido.radio("Sentido", [True, False], format_func=lambda c: "⬆️" if c else "⬇️",
+                                  horizontal=True, key="sentido_tabela", on_change=voltar_primeira_pagina)
+    tamanho_pagina = col_tamanho.selectbox("Linhas por página", TAMANHOS_PAGINA, index=1,
+                                           key="tamanho_pagina_tabela", on_change=voltar_primeira_pagina)
+
+    posicoes = posicoes_visiveis(df_filtrado, colunas_existentes, busca, coluna_ordem, crescente)
+    total_paginas = max(1, -(-len(posicoes) // tamanho_pagina))
+    if st.session_state.get("pagina_tabela", 1) > total_paginas:
+        st.session_state.pagina_tabela = total_paginas
+    pagina = st.number_input("Página", min_value=1, max_value=total_paginas, step=1, key="pagina_tabela")
+
+    st.dataframe(fatiar_pagina(df_filtrado, colunas_existentes, posicoes, pagina, tamanho_pagina), hide_index=True)
+    inicio = (pagina - 1) * tamanho_pagina
+    st.caption(f"Linhas {min(inicio + 1, len(posicoes))}–{min(inicio + tamanho_pagina, len(posicoes))} "
+               f"de {len(posicoes)} (página {pagina} de {total_paginas}; {len(df_filtrado)} usinas filtradas)")
+
+    # 📤 Exportar dados filtrados (busca e ordenação aplicadas): o arquivo só é gerado quando o botão é clicado
+    col_formato, col_baixar = st.columns([2, 1], vertical_alignment="bottom")
+    formato = col_formato.segmented_control("Formato de exportação", list(FORMATOS_EXPORTACAO), default="csv",
+                                            format_func=lambda f: FORMATOS_EXPORTACAO[f][0], key="formato_exportacao")
+    formato = formato or "csv"
+    excede_xlsx = formato == "xlsx" and len(posicoes) > LIMITE_LINHAS_XLSX
+    col_baixar.download_button(
+        f"📥 Baixar {FORMATOS_EXPORTACAO[formato][0]}",
+        lambda: exportar(df_filtrado, colunas_existentes, formato, busca, coluna_ordem, crescente),
+        f"dados_filtrados.{formato}", FORMATOS_EXPORTACAO[formato][1], on_click="ignore", disabled=excede_xlsx
+    )
+    if excede_xlsx:
+        st.warning(f"⚠️ O Excel comporta até {LIMITE_LINHAS_XLSX} linhas. Use CSV ou Parquet para esta seleção.")
+
+
+@st.fragment
+def secao_graficos(df_filtrado, celulas_filtradas):
+    if not df_filtrado.empty:
+        exibir_indicadores(df_filtrado, celulas_filtradas)
+        grafico_temporal(df_filtrado, celulas_filtradas)
+        grafico_barras(df_filtrado, celulas_filtradas)
+        grafico_barra_com_media_anual(df_filtrado, celulas_filtradas)
+
+
+@st.fragment
+def secao_mapa(df_filtrado):
+    if not df_filtrado.empty:
+        tipo_mapa = st.radio("📍 Selecione o tipo de mapa:", ["Mapa Normal", "Mapa de Calor"])
+        mapa_usinas(df_filtrado, tipo_mapa)
+
+
+def opcoes_analise_espacial(df_filtrado):
+    """Widgets de configuração da ESDA; retorna os parâmetros repassados às funções de esda_analysis."""
+    # ⬡ Seleções muito grandes começam no modo agregado por hexágonos
+    unidade = st.radio(
+        "🧩 Unidade de análise:", list(ROTULOS_UNIDADES), format_func=ROTULOS_UNIDADES.get,
+        index=1 if len(df_filtrado) > LIMITE_USINAS_PONTUAL else 0, horizontal=True,
+        key="unidade_esda"
+    )
+    if unidade == "hexagono":
+        return {
+            "unidade": unidade,
+            "tamanho_hex_km": st.slider("⬡ Raio do hexágono (km):", 10, 200, 50, step=10, key="tamanho_hex_km"),
+            "agregacao": st.selectbox("∑ Potência por hexágono:", list(ROTULOS_AGREGACOES),
+                                      format_func=ROTULOS_AGREGACOES.get, key="agregacao_hex"),
+        }
+    return {
+        "unidade": unidade,
+        "distancia_km": st.slider("📏 Distância da vizinhança (km):", 25, 1000, 300, step=25, key="distancia_km"),
+        "metodo_vizinhanca": st.selectbox(
+            "📏 Distância usada na vizinhança:", list(ROTULOS_METODOS),
+            format_func=ROTULOS_METODOS.get, key="metodo_vizinhanca"
+        ),
+    }
+
+
+def registrar_atualizacao(relatorio):
+    """Guarda o relatório de uma atualização incremental para exibi-lo após o rerun."""
+    if relatorio is not None:
+        st.session_state.setdefault("atualizacoes_snapshot", []).append(relatorio)
+
+
+def ingerir_csv(caminho, nome=None):
+    """Ingere um CSV de uploaded_files/; retorna a mensagem de erro, ou None em caso de sucesso.
+
+    Falhas ficam guardadas na sessão com a versão do arquivo (mtime, tamanho): enquanto o arquivo
+    não mudar, o CSV não é processado de novo a cada rerun e a mesma mensagem é devolvida.
+    """
+    nome = nome or os.path.basename(caminho)
+    info = os.stat(caminho)
+    versao = (info.st_mtime_ns, info.st_size)
+    falhas = st.session_state.setdefault("falhas_ingestao", {})
+    if nome in falhas and falhas[nome][0] == versao:
+        return falhas[nome][1]
+    try:
+        registrar_atualizacao(ingerir_snapshot(caminho, nome))
+    except Exception as e:
+        falhas[nome] = (versao, str(e))
+        return str(e)
+    falhas.pop(nome, None)
+    return None
+
+
+def exibir_atualizacoes():
+    """Resumo das atualizações incrementais de snapshots feitas nesta sessão (as mais recentes primeiro)."""
+    for relatorio in reversed(st.session_state.get("atualizacoes_snapshot", [])):
+        st.success(f"🔄 **{relatorio['nome']}** atualizado de forma incremental em {relatorio['segundos']:.2f} s: "
+                   f"{relatorio['incluidas']} usinas incluídas, {relatorio['removidas']} removidas e "
+                   f"{relatorio['alteradas']} alteradas ({relatorio['usinas_anteriores']} → {relatorio['usinas']}).")
+        with st.expander(f"🔎 Detalhes da atualização de {relatorio['nome']}", expanded=False):
+            st.write(f"**UFs regravadas:** {', '.join(relatorio['ufs_regravadas']) or 'nenhuma'} · "
+                     f"**UFs reaproveitadas:** {relatorio['ufs_reaproveitadas']}")
+            if relatorio["colunas_alteradas"]:
+                st.dataframe({"Coluna": list(relatorio["colunas_alteradas"]),
+                              "Usinas alteradas": list(relatorio["colunas_alteradas"].values())}, hide_index=True)
+            for tipo, codigos in relatorio["codigos"].items():
+                if codigos:
+                    st.write(f"**CEGs {tipo}** ({len(codigos)} de {relatorio[tipo]}): {', '.join(codigos)}")
+        if st.button("Dispensar", key=f"dispensar_{relatorio['hash_novo']}"):
+            st.session_state.atualizacoes_snapshot.remove(relatorio)
+            st.rerun()
+
+
+def id_sessao():
+    """Identificador da sessão do navegador (para acompanhar tarefas em segundo plano)."""
+    contexto = get_script_run_ctx()
+    return contexto.session_id if contexto else None
+
+
+@st.fragment(run_every=1)
+def acompanhar_tarefa_esda(chave):
+    """Barra de progresso da ESDA em segundo plano; ao terminar, reexecuta o app para exibir o resultado."""
+    tarefa = executor_tarefas.obter(chave)
+    if tarefa is None or tarefa.finalizada:
+        st.rerun()
+    st.progress(tarefa.progresso, text=f"⏳ Análise espacial em segundo plano: {tarefa.mensagem}")
+    if st.button("⏹️ Cancelar análise", key="cancelar_esda"):
+        executor_tarefas.liberar(chave, id_sessao())
+        st.session_state.pop("esda_pedido", None)
+        st.rerun()
+
+
+@st.fragment
+def secao_espacial(df_filtrado):
+    if df_filtrado.empty:
+        return
+    opcoes_esda = opcoes_analise_espacial(df_filtrado)
+
+    # ▶️ A ESDA só roda sob demanda: mudanças de filtro ou de parâmetros pedem uma nova execução
+    pedido = (assinatura_de(df_filtrado), tuple(sorted(opcoes_esda.items())))
+    if st.button("▶️ Executar análise espacial", type="primary", key="executar_esda"):
+        st.session_state.esda_pedido = pedido
+
+    # 🛑 Filtros ou parâmetros mudaram: a tarefa anterior deixa de ser aguardada por esta sessão
+    # (e é cancelada se nenhuma outra sessão pediu os mesmos parâmetros)
+    pedido_anterior = st.session_state.get("esda_pedido")
+    if pedido_anterior is not None and pedido_anterior != pedido:
+        executor_tarefas.liberar(pedido_anterior, id_sessao())
+        st.session_state.pop("esda_pedido")
+
+    if st.session_state.get("esda_pedido") != pedido:
+        st.info(f"🧭 Clique em **Executar análise espacial** para calcular Moran, LISA e o mapa de clusters "
+                f"para as {len(df_filtrado)} usinas filtradas.")
+    else:
+        # ⏳ Moran + LISA em segundo plano; sessões com o mesmo pedido compartilham a mesma tarefa
+        tarefa = executor_tarefas.submeter(pedido, obter_resultado_esda, df_filtrado, interessado=id_sessao(),
+                                           **opcoes_esda)
+        if not tarefa.finalizada:
+            acompanhar_tarefa_esda(pedido)
+        elif tarefa.estado == ERRO:
+            st.error(f"Erro na análise espacial: {tarefa.erro}")
+        elif tarefa.estado == CANCELADA:
+            st.warning("⚠️ A análise espacial foi cancelada. Clique em **Executar análise espacial** para recomeçar.")
+        elif tarefa.resultado is None:
+            st.warning("⚠️ Não há dados válidos de coordenadas após limpeza.")
+        else:
+            # 📈 Correlograma: I global em várias distâncias com uma única busca de pares
+            if st.toggle("📈 Mostrar correlograma de Moran (escolha da escala)", key="mostrar_correlograma"):
+                faixa_km = st.slider("Faixa de distâncias do correlograma (km):", 25, 1000, (25, 500),
+                                     step=25, key="faixa_correlograma")
+                exibir_correlograma(df_filtrado, faixa_km, **opcoes_esda)
+
+            calcular_moran_global(df_filtrado, resultado=tarefa.resultado, **opcoes_esda)
+            calcular_lisa_local(df_filtrado, resultado=tarefa.resultado, **opcoes_esda)
+            mapa_interativo_lisa(df_filtrado, resultado=tarefa.resultado, **opcoes_esda)
+
+        with st.expander("📘 Sobre a Análise Espacial: conceitos, interpretação e uso", expanded=False):
+            st.markdown("""
+        A análise realizada aqui faz uso de **técnicas de Análise Exploratória de Dados Espaciais (ESDA)**, aplicadas à variável **Potência Fiscalizada (kW)** das usinas selecionadas.
+
+        ---
+
+        ### 📐 **1. Índice de Moran (Global)**
+
+        O **Moran’s I** é um índice estatístico que mede se valores semelhantes estão **espacialmente agrupados**:
+
+        - 🔼 `I > 0`: agrupamento de valores semelhantes (autocorrelação positiva)
+        - 🔽 `I < 0`: vizinhos com valores diferentes (dispersão)
+        - ⚪ `I ≈ 0`: distribuição aleatória
+
+        > 📊 O **p-valor** indica se essa autocorrelação é **estatisticamente significativa** (`p < 0.05`).
+
+        ---
+
+        ### 🧭 **2. LISA – Indicadores Locais de Associação Espacial**
+
+        O **LISA (Local Indicators of Spatial Association)** calcula o **nível de autocorrelação ponto a ponto**, permitindo detectar **clusters locais**:
+
+        | Cluster | Significado |
+        |--------|-------------|
+        | 🔴 **Alta–Alta (Hotspot)** | Valor alto cercado por altos |
+        | 🔵 **Baixa–Baixa (Coldspot)** | Valor baixo cercado por baixos |
+        | 🟠 **Baixa–Alta (Outlier)** | Valor baixo cercado por altos |
+        | 🟢 **Alta–Baixa (Outlier)** | Valor alto cercado por baixos |
+        | ⚪ **Não Significativo** | Nenhuma autocorrelação espacial relevante |
+
+        ---
+
+        ### 🎯 **3. Aplicações Práticas**
+
+        Essa análise ajuda a:
+
+        - Identificar **regiões com concentração energética** (hotspots)
+        - Avaliar **desequilíbrios na distribuição geográfica**
+        - Detectar **outliers** regionais com comportamento atípico
+        - Orientar **políticas públicas e expansão energética**
+                    """)
 
 # 🔄 Inicializar filtros no Streamlit
 inicializar_filtros()
 
 st.set_page_config(page_title="Dashboard de Usinas", layout="wide")
 
+# ⏱️ Agrupa as medições de instrumentação desta execução do script
+iniciar_execucao()
+
 # 📥 Upload de arquivos CSV
 uploaded_files = st.file_uploader("Escolha arquivos CSV", type=["csv"], accept_multiple_files=True)
 
-if uploaded_files:
-    for uploaded_file in uploaded_files:
-        salvar_arquivo(uploaded_file)
+if "uploads_ingeridos" not in st.session_state:
+    st.session_state.uploads_ingeridos = set()
+
+# 🧱 Ingestão única por upload: CSV → Parquet particionado
+novos_uploads = [f for f in uploaded_files or [] if f.file_id not in st.session_state.uploads_ingeridos]
+if novos_uploads:
+    with st.spinner("📦 Convertendo arquivos para o formato colunar..."):
+        for uploaded_file in novos_uploads:
+            st.session_state.uploads_ingeridos.add(uploaded_file.file_id)
+            # Uma falha mantém o arquivo pendente e é exibida abaixo, após o rerun
+            ingerir_csv(salvar_arquivo(uploaded_file), uploaded_file.name)
     st.rerun()
 
-# 📂 Listar arquivos disponíveis
+# 🧱 CSVs já presentes em uploaded_files/ mas ainda não convertidos (ou alterados)
+for arquivo_pendente in listar_arquivos_pendentes():
+    with st.spinner(f"📦 Convertendo {arquivo_pendente} para o formato colunar..."):
+        erro = ingerir_csv(os.path.join(UPLOAD_DIR, arquivo_pendente))
+    if erro is not None:
+        st.error(f"❌ Falha ao converter **{arquivo_pendente}**: {erro}")
+
+exibir_atualizacoes()
+
+# 📂 Listar datasets disponíveis
 arquivos_disponiveis = listar_arquivos()
 arquivos_selecionados = st.multiselect("📂 Selecione os arquivos para análise:", arquivos_disponiveis)
 
@@ -28,7 +314,12 @@ st.sidebar.title("⚙️ Filtros")
 
 # 📊 Se houver arquivos selecionados, carregar os dados
 if arquivos_selecionados:
-    df = carregar_dados(arquivos_selecionados)
+    erros_carga = {}
+    with medir("carregar_dados") as medicao:
+        df = carregar_dados(arquivos_selecionados, erros=erros_carga)
+        medicao["linhas"] = len(df)
+    for arquivo_com_erro, mensagem_erro in erros_carga.items():
+        st.error(f"❌ Falha ao carregar **{arquivo_com_erro}**: {mensagem_erro}")
 
     # 🚨 Verificar se o DataFrame está vazio ou tem colunas ausentes
     if df.empty:
@@ -114,6 +405,7 @@ if arquivos_selecionados:
 
         # 📌 Aplicar filtros
         df_filtrado = aplicar_filtros(df)
+        celulas_filtradas = fatiar_cubo(df)  # 🧊 Fatia do cubo agregado para gráficos e indicadores
 
         # 📌 Definir colunas de interesse
         colunas_interesse = [
@@ -123,84 +415,35 @@ if arquivos_selecionados:
         ]
 
         # 📌 Verificar se todas as colunas de interesse existem no DataFrame
+        # (as colunas derivadas do carregamento continuam disponíveis para gráficos, mapas e ESDA)
         colunas_existentes = [col for col in colunas_interesse if col in df_filtrado.columns]
-        df_filtrado = df_filtrado[colunas_existentes]  # Filtrar apenas as colunas que existem
 
         # 📌 Ordenar os dados pela data de início de vigência
         if "DatInicioVigencia" in df_filtrado.columns:
+            assinatura_filtro = assinatura_de(df_filtrado)
             df_filtrado = df_filtrado.sort_values(by=["DatInicioVigencia"])
-
-            # Criar nova aba de Análise Espacial
-            aba_tabela, aba_graficos, aba_mapa, aba_espacial = st.tabs([
-                "📋 Tabela de Dados", "📊 Gráficos", "🗺️ Mapa Geoespacial", "📌 Análise Espacial"
-            ])
-
-            with aba_tabela:
-                st.subheader("📌 Dados Filtrados")
-                st.dataframe(df_filtrado)
-
-            with aba_graficos:
-                if not df_filtrado.empty:
-                    exibir_indicadores(df_filtrado)
-                    grafico_temporal(df_filtrado)
-                    grafico_barras(df_filtrado)
-                    grafico_barra_com_media_anual(df_filtrado)
-
-            with aba_mapa:
-                if not df_filtrado.empty:
-                    tipo_mapa = st.radio("📍 Selecione o tipo de mapa:", ["Mapa Normal", "Mapa de Calor"])
-                    mapa_usinas(df_filtrado, tipo_mapa)
-
-            with aba_espacial:
-                if not df_filtrado.empty:
-                    calcular_moran_global(df_filtrado)
-                    calcular_lisa_local(df_filtrado)
-                    mapa_interativo_lisa(df_filtrado)
-                    with st.expander("📘 Sobre a Análise Espacial: conceitos, interpretação e uso", expanded=False):
-                        st.markdown("""
-                    A análise realizada aqui faz uso de **técnicas de Análise Exploratória de Dados Espaciais (ESDA)**, aplicadas à variável **Potência Fiscalizada (kW)** das usinas selecionadas.
-
-                    ---
-
-                    ### 📐 **1. Índice de Moran (Global)**
-
-                    O **Moran’s I** é um índice estatístico que mede se valores semelhantes estão **espacialmente agrupados**:
-
-                    - 🔼 `I > 0`: agrupamento de valores semelhantes (autocorrelação positiva)
-                    - 🔽 `I < 0`: vizinhos com valores diferentes (dispersão)
-                    - ⚪ `I ≈ 0`: distribuição aleatória
-
-                    > 📊 O **p-valor** indica se essa autocorrelação é **estatisticamente significativa** (`p < 0.05`).
-
-                    ---
-
-                    ### 🧭 **2. LISA – Indicadores Locais de Associação Espacial**
-
-                    O **LISA (Local Indicators of Spatial Association)** calcula o **nível de autocorrelação ponto a ponto**, permitindo detectar **clusters locais**:
-
-                    | Cluster | Significado |
-                    |--------|-------------|
-                    | 🔴 **Alta–Alta (Hotspot)** | Valor alto cercado por altos |
-                    | 🔵 **Baixa–Baixa (Coldspot)** | Valor baixo cercado por baixos |
-                    | 🟠 **Baixa–Alta (Outlier)** | Valor baixo cercado por altos |
-                    | 🟢 **Alta–Baixa (Outlier)** | Valor alto cercado por baixos |
-                    | ⚪ **Não Significativo** | Nenhuma autocorrelação espacial relevante |
-
-                    ---
-
-                    ### 🎯 **3. Aplicações Práticas**
-
-                    Essa análise ajuda a:
-
-                    - Identificar **regiões com concentração energética** (hotspots)
-                    - Avaliar **desequilíbrios na distribuição geográfica**
-                    - Detectar **outliers** regionais com comportamento atípico
-                    - Orientar **políticas públicas e expansão energética**
-                                """)
-
-            # 📤 Exportar dados filtrados
-            st.download_button("📥 Baixar CSV", df_filtrado.to_csv(index=False), "dados_filtrados.csv", "text/csv")
+            if assinatura_filtro is not None:
+                # A ordenação é determinística: o resultado continua identificável para os caches da ESDA
+                assinar(df_filtrado, ("ordenado", assinatura_filtro, "DatInicioVigencia"))
+
+            # 🧭 Navegação entre seções (apenas a seção ativa é calculada)
+            secao = st.radio("Seção", list(SECOES), format_func=SECOES.get, horizontal=True,
+                             label_visibility="collapsed", key="secao_ativa")
+
+            if secao == "tabela":
+                secao_tabela(df_filtrado, colunas_existentes)
+            elif secao == "graficos":
+                secao_graficos(df_filtrado, celulas_filtradas)
+            elif secao == "mapa":
+                secao_mapa(df_filtrado)
+            else:
+                secao_espacial(df_filtrado)
         else:
             st.warning("⚠️ Nenhum dado encontrado com os filtros selecionados. Tente ajustar os filtros para visualizar informações.")
 else:
-    st.info("🚀 Faça o upload e selecione os arquivos para análise.")
\ No newline at end of file
+    st.info("🚀 Faça o upload e selecione os arquivos para análise.")
+
+# ⏱️ Instrumentação por etapa (também ligada para todos com INSTRUMENTACAO=1)
+with st.sidebar.expander("🛠️ Diagnóstico", expanded=False):
+    st.toggle("⏱️ Medir tempo por etapa", key="instrumentacao_ativa")
+exibir_instrumentacao()
\ No newline at end of file
@@ -0,0 +1,92 @@
+import os
+import hashlib
+import numpy as np
+import scipy.sparse as sp
+from scipy.spatial import cKDTree
+from pyproj import Transformer
+from libpysal.weights import WSP
+from cache_lru import CacheLRU
+
+# 🌐 Matrizes de vizinhança compartilhadas pelas análises ESDA (Moran global, LISA e mapa interativo)
+KM_POR_GRAU = 111
+RAIO_TERRA_KM = 6371.0088
+CRS_PROJETADO = "EPSG:5880"  # SIRGAS 2000 / Brazil Polyconic
+
+
+def tamanho_pesos(w):
+    """Estimativa de memória de um W: listas Python de vizinhos e pesos dominam (~100 bytes por ligação)."""
+    return w.nonzero * 100 + w.n * 200
+
+
+cache_pesos = CacheLRU(int(os.environ.get("CACHE_PESOS_MB", "512")) * 1024 * 1024, medir=tamanho_pesos)
+
+
+def chave_coordenadas(coords):
+    """Hash do conjunto ordenado de coordenadas (a ordem define a linha de cada usina na matriz)."""
+    return hashlib.sha1(np.ascontiguousarray(coords, dtype="float64").tobytes()).hexdigest()
+
+
+def matriz_para_pesos(pares, n):
+    """Converte pares (i, j) de vizinhos em pesos binários simétricos, padronizados por linha."""
+    linhas = np.concatenate([pares[:, 0], pares[:, 1]])
+    colunas = np.concatenate([pares[:, 1], pares[:, 0]])
+    matriz = sp.csr_matrix((np.ones(len(linhas)), (linhas, colunas)), shape=(n, n))
+    w = WSP(matriz).to_W(silence_warnings=True)
+    w.transform = "r"
+    return w
+
+
+def pares_graus(coords, distancia_km):
+    """Pares a até `distancia_km`, convertendo km em graus (distancia_km / 111) e medindo em lon/lat."""
+    return cKDTree(coords).query_pairs(distancia_km / KM_POR_GRAU, output_type="ndarray")
+
+
+def pares_geodesicos(coords, distancia_km):
+    """Pares a até `distancia_km` pela distância de grande círculo (equivalente à haversine).
+
+    Os pontos vão para vetores unitários 3D; a corda 2·sen(d / 2R) é monotônica na distância
+    geodésica, então a busca em árvore KD pela corda devolve exatamente os mesmos pares.
+    """
+    lon, lat = np.radians(coords[:, 0]), np.radians(coords[:, 1])
+    xyz = np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+    corda = 2 * np.sin(min(distancia_km / (2 * RAIO_TERRA_KM), np.pi / 2))
+    return cKDTree(xyz).query_pairs(corda, output_type="ndarray")
+
+
+def projetar(coords):
+    """Converte longitude/latitude (EPSG:4326) em metros na projeção Policônica do Brasil (EPSG:5880)."""
+    transformador = Transformer.from_crs("EPSG:4326", CRS_PROJETADO, always_xy=True)
+    return np.column_stack(transformador.transform(coords[:, 0], coords[:, 1]))
+
+
+def pares_projetados(coords, distancia_km):
+    """Pares a até `distancia_km` medidos em metros na projeção Policônica do Brasil (EPSG:5880)."""
+    return cKDTree(projetar(coords)).query_pairs(distancia_km * 1000, output_type="ndarray")
+
+
+METODOS_VIZINHANCA = {
+    "graus": pares_graus,
+    "geodesica": pares_geodesicos,
+    "projetada": pares_projetados,
+}
+
+ROTULOS_METODOS = {
+    "graus": "Graus (aproximação km/111)",
+    "geodesica": "Geodésica (grande círculo)",
+    "projetada": "Projeção Policônica (EPSG:5880)",
+}
+
+
+def construir_pesos(coords, distancia_km, metodo="graus"):
+    """Vizinhança por banda de distância, com o método de distância escolhido e busca em árvore KD."""
+    coords = np.asarray(coords, dtype="float64")
+    return matriz_para_pesos(METODOS_VIZINHANCA[metodo](coords, distancia_km), len(coords))
+
+
+def obter_pesos(coords, distancia_km, metodo="graus"):
+    """Retorna a matriz de vizinhança para as coordenadas, a distância e o método, construindo-a só uma vez."""
+    chave = (chave_coordenadas(coords), distancia_km, metodo)
+    w = cache_pesos.obter(chave)
+    if w is None:
+        w = cache_pesos.guardar(chave, construir_pesos(coords, distancia_km, metodo))
+    return w
@@ -0,0 +1,262 @@
+"""Relatórios em lote, sem Streamlit, para uma grade de combinações de filtros.
+
+Os dados são carregados uma única vez (com o mesmo carregar_dados do painel) e cada combinação
+(ex.: uma por UF e fonte) é processada em um pool de processos. Para cada combinação são gravados
+agregados (CSV), o resumo com Moran global e contagem de clusters (JSON), a tabela LISA (CSV) e
+figuras estáticas (PNG); um resumo.csv reúne todas as combinações.
+
+Uso (na raiz do projeto, com os datasets já ingeridos pelo painel):
+    python relatorios_lote.py --por uf fonte --inicio 2000-01 --fim 2024-12 --saida relatorios/2024-12
+    python relatorios_lote.py --arquivos siga.csv --por uf --ufs SP MG BA --sem-esda
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import re
+import time
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import pandas as pd
+
+import inferencia_esda
+from agregados import fatiar_cubo, obter_cubo, serie_temporal, soma_por
+from cache_lru import assinar, assinatura_de
+from data_loader import carregar_dados
+from esda_analysis import CORES_CLUSTERS, LIMITE_USINAS_PONTUAL, obter_resultado_esda
+from file_manager import listar_arquivos
+from filters import aplicar_filtros, obter_indice
+
+# 🧮 Dimensões que podem ser abertas em uma combinação por valor
+DIMENSOES = {"uf": "SigUFPrincipal", "origem": "DscOrigemCombustivel", "fonte": "NomFonteCombustivel"}
+COLUNA_VALOR = "MdaPotenciaFiscalizadaKw"
+
+_dados = None
+
+
+def slug(texto):
+    """Nome de arquivo seguro: sem acentos, com hífens no lugar de espaços e símbolos."""
+    texto = unicodedata.normalize("NFKD", str(texto)).encode("ascii", "ignore").decode()
+    return re.sub(r"[^A-Za-z0-9]+", "-", texto).strip("-") or "todos"
+
+
+def chave_mes(texto):
+    """'AAAA-MM' → ano * 12 + mês, a mesma chave usada pelos filtros do painel."""
+    ano, mes = (int(parte) for parte in texto.split("-"))
+    return ano * 12 + mes
+
+
+def montar_grade(df, por, selecoes):
+    """Combinações de filtros: um valor de cada dimensão em `por`; as demais usam toda a seleção.
+
+    `selecoes` mapeia cada dimensão para os valores escolhidos (None = todos os presentes nos dados).
+    """
+    valores = {}
+    for dimensao, coluna in DIMENSOES.items():
+        presentes = df[coluna].dropna().unique().tolist()
+        escolhidos = selecoes.get(dimensao)
+        valores[dimensao] = sorted(v for v in presentes if escolhidos is None or v in escolhidos)
+
+    grade = []
+    for combinacao in itertools.product(*[[[v] for v in valores[d]] for d in por]):
+        filtro = dict(valores)
+        filtro.update(zip(por, combinacao))
+        nome = "__".join(slug(filtro[d][0]) for d in por) or "todos"
+        grade.append({"nome": nome, **filtro})
+    return grade
+
+
+def _definir_dados(df, processos_esda=1, assinatura=None):
+    """Inicializador dos processos: os dados ficam globais e, por padrão, a ESDA não abre um pool dentro do pool.
+
+    Com fork, o índice de filtros e o cubo chegam prontos do processo principal. Com spawn/forkserver o
+    DataFrame chega copiado, sem a assinatura (ligada ao id do objeto): ele é assinado de novo e o índice
+    e o cubo são construídos uma vez por processo, e não a cada combinação.
+    """
+    global _dados
+    if assinatura is not None and assinatura_de(df) is None:
+        assinar(df, assinatura)
+    _dados = df
+    inferencia_esda.PROCESSOS_ESDA = processos_esda
+    obter_indice(df)
+    obter_cubo(df)
+
+
+def figura_barras(serie, titulo, rotulo_x, caminho):
+    fig, ax = plt.subplots(figsize=(12, 5))
+    serie.plot(kind="bar", ax=ax)
+    ax.set_title(titulo)
+    ax.set_xlabel(rotulo_x)
+    ax.set_ylabel("Potência Fiscalizada (kW)")
+    fig.tight_layout()
+    fig.savefig(caminho, dpi=110)
+    plt.close(fig)
+
+
+def figura_serie(serie, caminho):
+    fig, ax = plt.subplots(figsize=(12, 5))
+    for uf, grupo in serie.groupby("SigUFPrincipal", observed=True):
+        ax.plot(grupo["DatInicioVigencia"], grupo[COLUNA_VALOR], label=uf, linewidth=1)
+    ax.set_title("Potência Fiscalizada por mês de início de vigência")
+    ax.set_ylabel("Potência Fiscalizada (kW)")
+    if serie["SigUFPrincipal"].nunique() <= 12:
+        ax.legend(ncol=6, fontsize=8)
+    fig.tight_layout()
+    fig.savefig(caminho, dpi=110)
+    plt.close(fig)
+
+
+def figura_clusters(resultado, caminho):
+    gdf = resultado.gdf
+    fig, ax = plt.subplots(figsize=(8, 8))
+    for cluster, cor in CORES_CLUSTERS.items():
+        parte = gdf[gdf["Cluster"] == cluster]
+        if not parte.empty:
+            rotulo = re.sub(r"[^\w\s-]", "", cluster).strip()  # sem emojis, ausentes da fonte do Matplotlib
+            parte.plot(ax=ax, color=cor, markersize=6, edgecolor="none", label=f"{rotulo} ({len(parte)})")
+    ax.set_title(f"Clusters LISA — Moran's I = {resultado.I:.4f} (p = {resultado.p_sim:.4f})")
+    ax.legend(fontsize=8, loc="lower left")
+    ax.set_axis_off()
+    fig.tight_layout()
+    fig.savefig(caminho, dpi=110)
+    plt.close(fig)
+
+
+def gerar_relatorio(combinacao, periodo, opcoes_esda, saida):
+    """Filtra, agrega, roda a ESDA e grava os arquivos de uma combinação; retorna a linha do resumo."""
+    inicio = time.perf_counter()
+    df = _dados
+    filtros = (*periodo, combinacao["origem"], combinacao["fonte"], combinacao["uf"])
+    df_filtrado = aplicar_filtros(df, filtros)
+    diretorio = os.path.join(saida, combinacao["nome"])
+    os.makedirs(diretorio, exist_ok=True)
+
+    resumo = {
+        "combinacao": combinacao["nome"],
+        "usinas": len(df_filtrado),
+        "potencia_total_kw": float(df_filtrado[COLUNA_VALOR].sum()),
+        "potencia_media_kw": float(df_filtrado[COLUNA_VALOR].mean()) if len(df_filtrado) else None,
+    }
+    if df_filtrado.empty:
+        return escrever_resumo(diretorio, resumo, combinacao, inicio)
+
+    # 📊 Agregados (mesmo cubo dos gráficos do painel)
+    celulas = fatiar_cubo(df, filtros)
+    por_ano = soma_por(celulas, "Ano")
+    por_uf = soma_por(celulas, "SigUFPrincipal")
+    serie = serie_temporal(celulas, "Mês")
+    por_ano.to_csv(os.path.join(diretorio, "potencia_por_ano.csv"))
+    por_uf.to_csv(os.path.join(diretorio, "potencia_por_uf.csv"))
+    serie.to_csv(os.path.join(diretorio, "serie_mensal.csv"), index=False)
+    figura_barras(por_ano, "Potência Fiscalizada por Ano", "Ano", os.path.join(diretorio, "potencia_por_ano.png"))
+    figura_barras(por_uf, "Potência Fiscalizada por Estado", "Estado", os.path.join(diretorio, "potencia_por_uf.png"))
+    figura_serie(serie, os.path.join(diretorio, "serie_mensal.png"))
+
+    # 📌 Moran global e LISA
+    if opcoes_esda is not None:
+        opcoes = dict(opcoes_esda)
+        if opcoes["unidade"] == "auto":
+            opcoes["unidade"] = "hexagono" if len(df_filtrado) > LIMITE_USINAS_PONTUAL else "usina"
+        try:
+            resultado = obter_resultado_esda(df_filtrado, **opcoes)
+        except Exception as e:
+            resultado = None
+            resumo["erro_esda"] = str(e)
+        if resultado is not None:
+            contagens = resultado.gdf["Cluster"].value_counts()
+            resumo.update({
+                "unidade_esda": resultado.unidade,
+                "unidades_esda": len(resultado.gdf),
+                "moran_I": float(resultado.I),
+                "moran_p_sim": float(resultado.p_sim),
+                **{f"clusters_{slug(c)}": int(contagens.get(c, 0)) for c in CORES_CLUSTERS},
+            })
+            resultado.tabela().to_csv(os.path.join(diretorio, "lisa.csv"), index=False)
+            figura_clusters(resultado, os.path.join(diretorio, "clusters_lisa.png"))
+
+    return escrever_resumo(diretorio, resumo, combinacao, inicio)
+
+
+def escrever_resumo(diretorio, resumo, combinacao, inicio):
+    resumo["segundos"] = round(time.perf_counter() - inicio, 3)
+    with open(os.path.join(diretorio, "resumo.json"), "w", encoding="utf-8") as f:
+        json.dump({**resumo, "filtros": {d: combinacao[d] for d in DIMENSOES}}, f, ensure_ascii=False, indent=2)
+    return resumo
+
+
+def anunciar(resumo):
+    print(f"  ✅ {resumo['combinacao']} ({resumo['usinas']} usinas, {resumo['segundos']} s)", flush=True)
+    return resumo
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--arquivos", nargs="+", help="datasets ingeridos (padrão: todos os disponíveis)")
+    parser.add_argument("--por", nargs="*", choices=list(DIMENSOES), default=["uf"],
+                        help="dimensões abertas em uma combinação por valor")
+    parser.add_argument("--ufs", nargs="+")
+    parser.add_argument("--origens", nargs="+")
+    parser.add_argument("--fontes", nargs="+")
+    parser.add_argument("--inicio", help="início do período (AAAA-MM; padrão: primeiro mês dos dados)")
+    parser.add_argument("--fim", help="fim do período (AAAA-MM; padrão: último mês dos dados)")
+    parser.add_argument("--saida", default="relatorios")
+    parser.add_argument("--processos", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--sem-esda", action="store_true", help="gera apenas agregados e gráficos")
+    parser.add_argument("--unidade", choices=["auto", "usina", "hexagono"], default="auto")
+    parser.add_argument("--distancia-km", type=float, default=300)
+    parser.add_argument("--metodo-vizinhanca", default="graus")
+    parser.add_argument("--tamanho-hex-km", type=float, default=50)
+    parser.add_argument("--permutacoes", type=int, default=999)
+    args = parser.parse_args()
+
+    erros = {}
+    df = carregar_dados(args.arquivos or listar_arquivos(), ufs=args.ufs, erros=erros)
+    for arquivo, mensagem in erros.items():
+        print(f"❌ Falha ao carregar {arquivo}: {mensagem}")
+    if df.empty:
+        parser.error("nenhum dado carregado")
+
+    datas = df["DatInicioVigencia"].dropna()
+    periodo = (chave_mes(args.inicio) if args.inicio else datas.min().year * 12 + datas.min().month,
+               chave_mes(args.fim) if args.fim else datas.max().year * 12 + datas.max().month)
+    grade = montar_grade(df, args.por, {"uf": args.ufs, "origem": args.origens, "fonte": args.fontes})
+    opcoes_esda = None if args.sem_esda else {
+        "unidade": args.unidade, "distancia_km": args.distancia_km, "metodo_vizinhanca": args.metodo_vizinhanca,
+        "tamanho_hex_km": args.tamanho_hex_km, "permutacoes": args.permutacoes,
+    }
+    os.makedirs(args.saida, exist_ok=True)
+    print(f"{len(df)} usinas carregadas | {len(grade)} combinações | {args.processos} processos")
+
+    # Índice de filtros e cubo construídos antes do pool: os processos (fork) já os recebem prontos
+    obter_indice(df)
+    obter_cubo(df)
+
+    inicio = time.perf_counter()
+    resumos = []
+    if args.processos > 1:
+        # fork (onde existir) herda os dados sem serializá-los; nos demais métodos, o initializer os prepara
+        contexto = multiprocessing.get_context("fork" if "fork" in multiprocessing.get_all_start_methods() else None)
+        with ProcessPoolExecutor(max_workers=args.processos, mp_context=contexto, initializer=_definir_dados,
+                                 initargs=(df, 1, assinatura_de(df))) as pool:
+            futuros = [pool.submit(gerar_relatorio, c, periodo, opcoes_esda, args.saida) for c in grade]
+            for futuro in as_completed(futuros):
+                resumos.append(anunciar(futuro.result()))
+    else:
+        # Um processo só: as permutações da ESDA continuam livres para usar o próprio pool
+        _definir_dados(df, inferencia_esda.PROCESSOS_ESDA)
+        for combinacao in grade:
+            resumos.append(anunciar(gerar_relatorio(combinacao, periodo, opcoes_esda, args.saida)))
+
+    tabela = pd.DataFrame(resumos).sort_values("combinacao").convert_dtypes()
+    colunas = [c for c in tabela.columns if c != "segundos"] + ["segundos"]
+    tabela[colunas].to_csv(os.path.join(args.saida, "resumo.csv"), index=False)
+    print(f"{len(resumos)} relatórios em {time.perf_counter() - inicio:.1f} s → {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import os
+import numpy as np
+import pandas as pd
+from cache_lru import CacheLRU, assinatura_de
+from instrumentacao import instrumentar
+
+# 📋 Tabela paginada: busca, ordenação e fatiamento no servidor; só a página visível vai para o navegador
+TAMANHOS_PAGINA = [25, 50, 100, 250, 500]
+
+# 🗂️ Ordens de linhas (posições) já calculadas por dataset filtrado, busca e coluna de ordenação
+cache_ordens = CacheLRU(int(os.environ.get("CACHE_ORDENS_MB", "64")) * 1024 * 1024)
+
+
+def colunas_texto(df, colunas):
+    """Colunas de `colunas` em que a busca textual se aplica (texto e categorias)."""
+    return [col for col in colunas
+            if isinstance(df[col].dtype, pd.CategoricalDtype)
+            or pd.api.types.is_string_dtype(df[col].dtype)]
+
+
+def mascara_busca(df, colunas, termo):
+    """Linhas em que alguma das `colunas` contém `termo`, sem diferenciar maiúsculas de minúsculas."""
+    mascara = np.zeros(len(df), dtype=bool)
+    for col in colunas:
+        serie = df[col]
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            # Busca apenas nas categorias distintas e expande pelos códigos; a posição extra (-1) é o ausente
+            encontradas = serie.cat.categories.astype(str).str.contains(termo, case=False, regex=False)
+            mascara |= np.append(np.asarray(encontradas, dtype=bool), False)[serie.cat.codes.to_numpy()]
+        else:
+            mascara |= serie.str.contains(termo, case=False, regex=False, na=False).to_numpy(dtype=bool)
+    return mascara
+
+
+@instrumentar()
+def posicoes_visiveis(df, colunas, busca="", coluna_ordem=None, crescente=True):
+    """Posições (iloc) das linhas que passam na `busca`, ordenadas por `coluna_ordem` (ausentes por último).
+
+    O resultado é memorizado pela assinatura do DataFrame: trocar de página não refaz busca nem ordenação.
+    """
+    busca = busca.strip()
+    assinatura = assinatura_de(df)
+    chave = (assinatura, tuple(colunas), busca, coluna_ordem, crescente)
+    if assinatura is not None:
+        posicoes = cache_ordens.obter(chave)
+        if posicoes is not None:
+            return posicoes
+
+    posicoes = np.arange(len(df))
+    if busca:
+        posicoes = np.flatnonzero(mascara_busca(df, colunas_texto(df, colunas), busca))
+    if coluna_ordem is not None:
+        valores = df[coluna_ordem].iloc[posicoes].reset_index(drop=True)
+        ordem = valores.sort_values(ascending=crescente, kind="stable", na_position="last").index.to_numpy()
+        posicoes = posicoes[ordem]
+
+    if assinatura is not None:
+        cache_ordens.guardar(chave, posicoes)
+    return posicoes
+
+
+def fatiar_pagina(df, colunas, posicoes, pagina, tamanho_pagina):
+    """Linhas da `pagina` (a partir de 1) com as `colunas` pedidas, sem os metadados (`attrs`) do original."""
+    inicio = (pagina - 1) * tamanho_pagina
+    trecho = df.iloc[posicoes[inicio:inicio + tamanho_pagina]][colunas]
+    trecho.attrs = {}
+    return trecho
@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# ⏳ Tarefas em segundo plano compartilhadas entre sessões (ex.: ESDA em seleções grandes)
+TRABALHADORES_TAREFAS = int(os.environ.get("TRABALHADORES_TAREFAS", "2"))
+MAX_TAREFAS_FINALIZADAS = 16
+
+PENDENTE, EXECUTANDO, CONCLUIDA, CANCELADA, ERRO = "pendente", "executando", "concluida", "cancelada", "erro"
+
+
+class TarefaCancelada(Exception):
+    """Levantada dentro da tarefa, no próximo ponto de progresso, depois de um pedido de cancelamento."""
+
+
+class Tarefa:
+    """Uma execução em segundo plano: estado, progresso (0 a 1), mensagem, resultado ou erro.
+
+    `interessados` são as sessões que aguardam o resultado; a tarefa só é cancelada quando nenhuma resta.
+    """
+
+    def __init__(self, chave):
+        self.chave = chave
+        self.estado = PENDENTE
+        self.progresso = 0.0
+        self.mensagem = "Na fila"
+        self.resultado = None
+        self.erro = None
+        self.interessados = set()
+        self.criada_em = time.time()
+        self._cancelamento = threading.Event()
+
+    @property
+    def finalizada(self):
+        return self.estado in (CONCLUIDA, CANCELADA, ERRO)
+
+    def relatar(self, feitas, total, mensagem=None):
+        """Callback de progresso passado à função da tarefa; também é o ponto de cancelamento."""
+        if self._cancelamento.is_set():
+            raise TarefaCancelada()
+        self.progresso = min(1.0, feitas / total) if total else 0.0
+        self.mensagem = mensagem or f"{feitas} de {total}"
+
+
+class ExecutorTarefas:
+    """Pool de threads com deduplicação por chave: sessões que pedem a mesma chave acompanham a mesma tarefa."""
+
+    def __init__(self, max_trabalhadores=TRABALHADORES_TAREFAS):
+        self._pool = ThreadPoolExecutor(max_workers=max_trabalhadores, thread_name_prefix="tarefa")
+        self._tarefas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submeter(self, chave, funcao, *args, interessado=None, **kwargs):
+        """Agenda `funcao(*args, ao_progredir=..., **kwargs)` sob `chave`, ou devolve a tarefa já existente.
+
+        Tarefas canceladas ou com erro são reagendadas; em andamento ou concluídas são reaproveitadas.
+        """
+        with self._lock:
+            tarefa = self._tarefas.get(chave)
+            if tarefa is None or tarefa.estado in (CANCELADA, ERRO):
+                tarefa = Tarefa(chave)
+                self._tarefas[chave] = tarefa
+                self._pool.submit(self._executar, tarefa, funcao, args, kwargs)
+            self._tarefas.move_to_end(chave)
+            if interessado is not None:
+                tarefa.interessados.add(interessado)
+            self._podar()
+            return tarefa
+
+    def obter(self, chave):
+        with self._lock:
+            return self._tarefas.get(chave)
+
+    def cancelar(self, chave):
+        """Pede o cancelamento: a tarefa para no próximo relato de progresso (ou antes de começar)."""
+        with self._lock:
+            tarefa = self._tarefas.get(chave)
+        if tarefa is not None and not tarefa.finalizada:
+            tarefa._cancelamento.set()
+            tarefa.mensagem = "Cancelando..."
+
+    def liberar(self, chave, interessado):
+        """A sessão deixou de aguardar a tarefa; sem outros interessados, ela é cancelada."""
+        with self._lock:
+            tarefa = self._tarefas.get(chave)
+            if tarefa is None:
+                return
+            tarefa.interessados.discard(interessado)
+            sem_interessados = not tarefa.interessados
+        if sem_interessados:
+            self.cancelar(chave)
+
+    def listar(self):
+        with self._lock:
+            return list(self._tarefas.values())
+
+    def _executar(self, tarefa, funcao, args, kwargs):
+        if tarefa._cancelamento.is_set():
+            tarefa.estado = CANCELADA
+            return
+        tarefa.estado = EXECUTANDO
+        tarefa.mensagem = "Iniciando"
+        try:
+            tarefa.resultado = funcao(*args, ao_progredir=tarefa.relatar, **kwargs)
+            tarefa.progresso = 1.0
+            tarefa.mensagem = "Concluída"
+            tarefa.estado = CONCLUIDA
+        except TarefaCancelada:
+            tarefa.mensagem = "Cancelada"
+            tarefa.estado = CANCELADA
+        except Exception as e:
+            tarefa.erro = str(e)
+            tarefa.mensagem = "Falhou"
+            tarefa.estado = ERRO
+
+    def _podar(self):
+        """Mantém apenas as MAX_TAREFAS_FINALIZADAS tarefas finalizadas mais recentes (chamado com o lock)."""
+        finalizadas = [c for c, t in self._tarefas.items() if t.finalizada]
+        for chave in finalizadas[:max(0, len(finalizadas) - MAX_TAREFAS_FINALIZADAS)]:
+            del self._tarefas[chave]
+
+
+executor_tarefas = ExecutorTarefas()
@@ -2,50 +2,99 @@ import streamlit as st
 import matplotlib.pyplot as plt
 import altair as alt
 import folium
-import pandas as pd
-from streamlit_folium import folium_static
-from folium.plugins import HeatMap
-
-def exibir_indicadores(df):
-    """Mostra indicadores rápidos no Streamlit."""
+from folium.plugins import HeatMap, FastMarkerCluster
+import streamlit.components.v1 as components
+import time
+from instrumentacao import instrumentar, medir
+import os
+from agregados import (GRANULARIDADES, agregar_grade, indicadores, reduzir_series, serie_temporal, soma_por,
+                       tamanho_celula_para_zoom)
+
+# 📦 Máximo de pontos enviados ao navegador pelo gráfico temporal
+PONTOS_MAXIMOS_GRAFICO = int(os.environ.get("PONTOS_MAXIMOS_GRAFICO", "5000"))
+
+# 🗺️ Acima deste número de usinas o "Mapa Normal" passa a usar agrupamento no navegador
+LIMITE_MARCADORES_INDIVIDUAIS = int(os.environ.get("LIMITE_MARCADORES_INDIVIDUAIS", "1000"))
+
+# Marcadores criados no navegador a partir de [lat, lon, nome, uf]; popup e tooltip montados só quando abertos
+CALLBACK_MARCADOR = """
+function (linha) {
+    var marcador = L.marker(new L.LatLng(linha[0], linha[1]));
+    marcador.bindTooltip(function () { return linha[2]; });
+    marcador.bindPopup(function () { return linha[2] + " - " + linha[3]; });
+    return marcador;
+}
+"""
+
+@instrumentar()
+def exibir_indicadores(df, celulas=None):
+    """Mostra indicadores rápidos no Streamlit (a partir da fatia do cubo agregado, se informada)."""
     if df.empty:
         st.warning("⚠️ Nenhum dado disponível para os indicadores.")
         return
 
-    st.metric("🔋 Total de Usinas", len(df))
-    st.metric("⚡ Potência Média (kW)", df["MdaPotenciaFiscalizadaKw"].mean())
+    if celulas is not None:
+        total_usinas, potencia_media = indicadores(celulas)
+    else:
+        total_usinas, potencia_media = len(df), df["MdaPotenciaFiscalizadaKw"].mean()
+    st.metric("🔋 Total de Usinas", total_usinas)
+    st.metric("⚡ Potência Média (kW)", potencia_media)
 
-def grafico_temporal(df):
-    """Gera gráfico de evolução da potência fiscalizada ao longo do tempo."""
+@instrumentar()
+def grafico_temporal(df, celulas=None, pontos_maximos=None):
+    """Gera gráfico de evolução da potência fiscalizada ao longo do tempo, agregado no servidor por período e UF."""
     if df.empty:
         st.warning("⚠️ Nenhum dado disponível para o gráfico temporal.")
         return
 
     st.subheader("📈 Evolução da Potência Fiscalizada ao longo do tempo")
-    chart = alt.Chart(df).mark_line().encode(
+    pontos_maximos = pontos_maximos or PONTOS_MAXIMOS_GRAFICO
+    granularidade = st.radio("🕒 Agrupar por:", list(GRANULARIDADES) + ["Usina (sem agregação)"],
+                             horizontal=True, key="granularidade_temporal")
+
+    if granularidade == "Usina (sem agregação)":
+        serie = df[["DatInicioVigencia", "MdaPotenciaFiscalizadaKw", "SigUFPrincipal"]]
+    elif celulas is not None:
+        serie = serie_temporal(celulas, granularidade)
+    else:
+        serie = serie_temporal(df, granularidade, coluna_valor="MdaPotenciaFiscalizadaKw")
+
+    # 📉 Redução com LTTB: o volume enviado ao navegador não depende do número de usinas
+    pontos_originais = len(serie)
+    serie = reduzir_series(serie, pontos_maximos)
+    if len(serie) < pontos_originais:
+        st.caption(f"ℹ️ Série reduzida de {pontos_originais} para {len(serie)} pontos preservando a forma das curvas.")
+
+    chart = alt.Chart(serie).mark_line().encode(
         x="DatInicioVigencia:T",
         y="MdaPotenciaFiscalizadaKw:Q",
         color="SigUFPrincipal:N"
     ).interactive()
     st.altair_chart(chart, use_container_width=True)
 
-def grafico_barras(df):
-    """Cria um gráfico de barras para distribuição de potência por estado."""
+@instrumentar()
+def grafico_barras(df, celulas=None):
+    """Cria um gráfico de barras para distribuição de potência por estado (a partir do cubo, se informado)."""
     if df.empty:
         st.warning("⚠️ Nenhum dado disponível para o gráfico de barras.")
         return
 
     st.subheader("📊 Distribuição de Potência Fiscalizada por Estado")
     fig, ax = plt.subplots(figsize=(12, 6))
-    df.groupby("SigUFPrincipal")["MdaPotenciaFiscalizadaKw"].sum().plot(kind="bar", ax=ax)
+    if celulas is not None:
+        potencia_por_estado = soma_por(celulas, "SigUFPrincipal")
+    else:
+        potencia_por_estado = df.groupby("SigUFPrincipal", observed=True)["MdaPotenciaFiscalizadaKw"].sum()
+    potencia_por_estado.plot(kind="bar", ax=ax)
     ax.set_ylabel("Potência Fiscalizada (kW)")
     ax.set_xlabel("Estado")
     ax.set_title("Distribuição de Potência por Estado")
     st.pyplot(fig)
 
 
-def grafico_barra_com_media_anual(df):
-    """Gera gráfico de barras com potência anual, média dos anos anteriores e média geral."""
+@instrumentar()
+def grafico_barra_com_media_anual(df, celulas=None):
+    """Gera gráfico de barras com potência anual, média dos anos anteriores e média geral (a partir do cubo, se informado)."""
     if df.empty or "DatInicioVigencia" not in df.columns:
         st.warning("⚠️ Dados insuficientes para gerar o gráfico por ano.")
         return
@@ -62,8 +111,10 @@ Esse gráfico ajuda a identificar anos com desempenho **acima ou abaixo da tend
 """)
 
     # 🎯 Preparar dados
-    df["Ano"] = df["DatInicioVigencia"].dt.year
-    df_ano = df.groupby("Ano")["MdaPotenciaFiscalizadaKw"].sum().reset_index()
+    if celulas is not None:
+        df_ano = soma_por(celulas, "Ano").reset_index()
+    else:
+        df_ano = df.groupby(df["DatInicioVigencia"].dt.year.rename("Ano"))["MdaPotenciaFiscalizadaKw"].sum().reset_index()
     df_ano = df_ano.sort_values("Ano")  # garantir ordenação cronológica
 
     # 📈 Média dos anos anteriores
@@ -103,38 +154,71 @@ Esse gráfico ajuda a identificar anos com desempenho **acima ou abaixo da tend
     st.altair_chart(chart_final, use_container_width=True)
 
 
+@instrumentar()
 def mapa_usinas(df, tipo_mapa="Mapa Normal"):
     """Cria um mapa interativo com a distribuição das usinas e opção de Heatmap."""
     if df.empty or "NumCoordNEmpreendimento" not in df.columns or "NumCoordEEmpreendimento" not in df.columns:
         st.warning("⚠️ Dados de latitude e longitude não disponíveis para criar o mapa.")
         return
 
-    # 🔄 Converter latitude e longitude para float (corrige erro de string)
-    df["NumCoordNEmpreendimento"] = pd.to_numeric(df["NumCoordNEmpreendimento"].astype(str).str.replace(",", "."), errors="coerce")
-    df["NumCoordEEmpreendimento"] = pd.to_numeric(df["NumCoordEEmpreendimento"].astype(str).str.replace(",", "."), errors="coerce")
-
-    # 🔍 Remover linhas com valores NaN após conversão
-    df = df.dropna(subset=["NumCoordNEmpreendimento", "NumCoordEEmpreendimento"])
+    # 🔍 Manter apenas linhas com coordenadas válidas (máscara calculada no carregamento)
+    df = df[df["CoordenadaValida"]]
 
     # 🚨 Verificar se ainda há dados após limpeza
     if df.empty:
-        st.warning("⚠️ Nenhum dado válido para exibir no mapa após conversão de coordenadas.")
+        st.warning("⚠️ Nenhum dado válido para exibir no mapa (coordenadas ausentes).")
         return
 
+    inicio = time.perf_counter()
+    mapa, grade = construir_mapa_usinas(df, tipo_mapa)
+    if grade is not None:
+        st.caption(f"🔥 {len(df):,} usinas agregadas em {len(grade):,} células, ponderadas pela potência fiscalizada.")
+
+    st.subheader("🗺️ Mapa Geoespacial - Distribuição das Usinas")
+    exibir_mapa(mapa, inicio)
+
+
+def construir_mapa_usinas(df, tipo_mapa="Mapa Normal", zoom_inicial=5):
+    """Monta o mapa Folium das usinas (com coordenadas válidas); retorna (mapa, grade do heatmap ou None)."""
+    grade = None
+
     # Criar mapa centralizado na média das coordenadas
-    mapa = folium.Map(location=[df["NumCoordNEmpreendimento"].mean(), df["NumCoordEEmpreendimento"].mean()], zoom_start=5)
+    mapa = folium.Map(location=[float(df["NumCoordNEmpreendimento"].mean()), float(df["NumCoordEEmpreendimento"].mean())], zoom_start=zoom_inicial)
 
     # 🔥 Selecione entre mapa normal ou heatmap
     if tipo_mapa == "Mapa de Calor":
-        heat_data = df[["NumCoordNEmpreendimento", "NumCoordEEmpreendimento"]].values.tolist()
+        # Pré-agregação em grade no servidor: só as células ocupadas, com a potência somada como peso
+        grade = agregar_grade(df, tamanho_celula_para_zoom(zoom_inicial, raio_px=15))
+        peso_maximo = grade["peso"].max()
+        grade["peso"] = grade["peso"] / peso_maximo if peso_maximo > 0 else 1.0
+        heat_data = grade[["lat", "lon", "peso"]].round(5).values.tolist()
         HeatMap(heat_data, radius=15, blur=10, max_zoom=10).add_to(mapa)
+    elif len(df) > LIMITE_MARCADORES_INDIVIDUAIS:
+        # 📍 Muitas usinas: um único array compacto, agrupado (clusters) no navegador
+        dados_marcadores = list(zip(
+            df["NumCoordNEmpreendimento"].to_numpy().round(5).tolist(),
+            df["NumCoordEEmpreendimento"].to_numpy().round(5).tolist(),
+            df["NomEmpreendimento"].astype(str).tolist(),
+            df["SigUFPrincipal"].astype(str).tolist()
+        ))
+        FastMarkerCluster(dados_marcadores, callback=CALLBACK_MARCADOR).add_to(mapa)
     else:
-        for _, row in df.iterrows():
+        for lat, lon, nome, uf in zip(df["NumCoordNEmpreendimento"].to_numpy(), df["NumCoordEEmpreendimento"].to_numpy(),
+                                      df["NomEmpreendimento"].to_numpy(), df["SigUFPrincipal"].to_numpy()):
             folium.Marker(
-                location=[row["NumCoordNEmpreendimento"], row["NumCoordEEmpreendimento"]],
-                popup=f"{row['NomEmpreendimento']} - {row['SigUFPrincipal']}",
-                tooltip=row['NomEmpreendimento']
+                location=[float(lat), float(lon)],
+                popup=f"{nome} - {uf}",
+                tooltip=nome
             ).add_to(mapa)
-
-    st.subheader("🗺️ Mapa Geoespacial - Distribuição das Usinas")
-    folium_static(mapa)
+    return mapa, grade
+
+
+def exibir_mapa(mapa, inicio, width=700, height=500):
+    """Renderiza o mapa Folium uma única vez e mostra tempo de construção e tamanho do HTML."""
+    with medir("folium: serializar mapa") as medicao:
+        html = mapa.get_root().render()
+        metricas = {"segundos_construcao": time.perf_counter() - inicio, "bytes_html": len(html.encode("utf-8"))}
+        components.html(html, width=width, height=height)
+        medicao["bytes_html"] = metricas["bytes_html"]
+    st.caption(f"⏱️ Mapa construído em {metricas['segundos_construcao']:.2f} s | 📦 HTML: {metricas['bytes_html'] / 1024:,.0f} KB")
+    return metricas